@@ -1,5 +1,33 @@
-from django.apps import AppConfig
+from django.apps import AppConfig, apps
 
 
 class DjangoDALConfig(AppConfig):
     name = "django_dal"
+
+    def ready(self):
+        from django_dal.media import media_registry
+        from django_dal.relations import compile_filter_plans
+
+        compile_filter_plans()
+        media_registry.build()
+
+        if apps.is_installed("django.contrib.auth"):
+            from django.contrib.auth import get_user_model
+            from django.contrib.auth.models import Group
+            from django.db.models.signals import m2m_changed, post_delete, post_save
+
+            from django_dal.media import invalidate_media_decisions
+            from django_dal.params import invalidate_user_group_cache
+
+            user_model = get_user_model()
+            if hasattr(user_model, "groups"):
+                m2m_changed.connect(invalidate_user_group_cache, sender=user_model.groups.through)
+                post_save.connect(invalidate_user_group_cache, sender=Group)
+                post_delete.connect(invalidate_user_group_cache, sender=Group)
+
+            if hasattr(user_model, "groups") and hasattr(user_model, "user_permissions"):
+                m2m_changed.connect(invalidate_media_decisions, sender=user_model.groups.through)
+                m2m_changed.connect(invalidate_media_decisions, sender=user_model.user_permissions.through)
+                m2m_changed.connect(invalidate_media_decisions, sender=Group.permissions.through)
+                post_save.connect(invalidate_media_decisions, sender=user_model)
+                post_delete.connect(invalidate_media_decisions, sender=Group)
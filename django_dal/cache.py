@@ -0,0 +1,130 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache import caches
+
+
+class LRUCache:
+    """
+    Thread safe, size bounded, least recently used cache with hit/miss counters
+    and optional expiration of the entries after ``timeout`` seconds.
+    """
+
+    def __init__(self, maxsize=1024, timeout=None):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expires = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.timeout if self.timeout is not None else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        :return: dict with hits, misses, hit ratio and current size
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "ratio": self.hits / total if total else 0.0,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+        }
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SharedCache:
+    """
+    Cache with the interface of ``LRUCache`` stored in a Django cache, so that it is shared between processes.
+
+    Keys are prefixed with ``prefix`` and with a generation token: ``clear()`` only replaces the generation,
+    so it never clears the other entries of the Django cache.
+    """
+
+    def __init__(self, alias, prefix, timeout=None):
+        self.cache = caches[alias]
+        self.prefix = prefix
+        self.timeout = timeout
+        self.maxsize = None
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, key):
+        generation_key = "{}.generation".format(self.prefix)
+        generation = self.cache.get(generation_key)
+        if generation is None:
+            self.cache.add(generation_key, uuid.uuid4().hex, None)
+            generation = self.cache.get(generation_key)
+        return "{}.{}.{}".format(self.prefix, generation, key)
+
+    def get(self, key, default=None):
+        value = self.cache.get(self._key(key), _missing)
+        if value is _missing:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.cache.set(self._key(key), value, self.timeout)
+
+    def delete(self, key):
+        self.cache.delete(self._key(key))
+
+    def clear(self):
+        self.cache.delete("{}.generation".format(self.prefix))
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        """
+        :return: dict with hits and misses of this process, and hit ratio
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "ratio": self.hits / total if total else 0.0,
+            "size": None,
+            "maxsize": None,
+        }
+
+
+_missing = object()
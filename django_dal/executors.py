@@ -0,0 +1,92 @@
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextvars import copy_context
+
+from django.apps import apps
+from django.db import close_old_connections, models
+
+from django_dal.params import get_context_params
+
+
+def serialize_params(values):
+    """
+    Make context params values serialisable, model instances (e.g. user and group) are replaced by their label and pk
+
+    :param values: dict of values by param name, e.g. from ``cxpr.get()``
+    :return: dict
+    """
+    serialized = {}
+    for name, value in values.items():
+        if isinstance(value, models.Model):
+            value = ("__model__", value._meta.label, value.pk)
+        serialized[name] = value
+    return serialized
+
+
+def deserialize_params(serialized):
+    """
+    Values of context params from ``serialize_params``, model instances are fetched again by pk
+    """
+    values = {}
+    for name, value in serialized.items():
+        if isinstance(value, tuple) and len(value) == 3 and value[0] == "__model__":
+            value = apps.get_model(value[1])._base_manager.get(pk=value[2])
+        values[name] = value
+    return values
+
+
+def _run_in_thread(context, fn, *args, **kwargs):
+    try:
+        return context.run(fn, *args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def _setup_process(initializer, initargs):
+    if not apps.ready:
+        import django
+
+        django.setup()
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def _run_in_process(serialized, fn, *args, **kwargs):
+    try:
+        return get_context_params().run(deserialize_params(serialized), fn, *args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+class DALExecutor(Executor):
+    """
+    Executor running callables with the context params of the code submitting them,
+    so that ``cxpr`` and the DAL managers filters work in the workers as in the caller.
+
+    With threads (default) callables run in a copy of the submitting context.
+    With ``processes=True`` the params are sent to the workers in a serialisable form (model instances
+    by pk, see ``serialize_params``) and fetched again there. Workers are spawned, not forked,
+    so that they never share the database connections of the parent, and callables must be picklable.
+
+    with DALExecutor(max_workers=4) as executor:
+        rows = list(executor.map(export_chunk, chunks))
+    """
+
+    def __init__(self, max_workers=None, processes=False, **kwargs):
+        self.processes = processes
+        if processes:
+            kwargs.setdefault("mp_context", multiprocessing.get_context("spawn"))
+            kwargs["initargs"] = (kwargs.pop("initializer", None), kwargs.pop("initargs", ()))
+            kwargs["initializer"] = _setup_process
+            self.executor = ProcessPoolExecutor(max_workers=max_workers, **kwargs)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=max_workers, **kwargs)
+
+    def submit(self, fn, /, *args, **kwargs):
+        if self.processes:
+            serialized = serialize_params(get_context_params().get())
+            return self.executor.submit(_run_in_process, serialized, fn, *args, **kwargs)
+        return self.executor.submit(_run_in_thread, copy_context(), fn, *args, **kwargs)
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        self.executor.shutdown(wait=wait, cancel_futures=cancel_futures)
@@ -0,0 +1,483 @@
+"""
+Registry of the models with file fields, used to authorize the access to media files.
+"""
+
+import datetime
+import hashlib
+import re
+import uuid
+from decimal import Decimal
+from urllib.parse import quote
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db.models import CharField, IntegerField, Model, Value
+from django.db.models.functions import Cast
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.urls import reverse
+
+from django_dal.cache import LRUCache
+from django_dal.params import get_context_params
+
+
+class MediaRegistry:
+    """
+    File fields of the installed models, and index of the rows owning each file path.
+
+    The index is filled with the owners found by ``BaseSendFileView`` and by ``post_save`` of the models
+    with file fields, as (model, field name, pk), entries are removed on ``post_delete``. The indexed rows are
+    looked up first, by pk: an entry is only a candidate, the row must still reference the path and be visible
+    to the user, so stale entries never grant access, they only cost a second query.
+    """
+
+    #: max number of rows indexed for each path, the last saved or found first
+    max_path_owners = 4
+
+    def __init__(self):
+        #: list of (model, field name)
+        self.fields = []
+        self.owners = None
+
+    def build(self):
+        """
+        Collect the file fields of the installed models and connect the signals maintaining the index
+        """
+        self.fields = []
+        self.owners = LRUCache(maxsize=getattr(settings, "DJANGO_DAL_MEDIA_INDEX_SIZE", 10000))
+        for model in apps.get_models():
+            field_names = [field.name for field in model._meta.fields if hasattr(field, "upload_to")]
+            for field_name in field_names:
+                self.fields.append((model, field_name))
+            if field_names:
+                post_save.connect(self.handle_post_save, sender=model, dispatch_uid="django_dal_media_save")
+                post_delete.connect(self.handle_post_delete, sender=model, dispatch_uid="django_dal_media_delete")
+
+    def get_model_fields(self, model):
+        return [field_name for field_model, field_name in self.fields if field_model is model]
+
+    def get_owners(self, path):
+        """
+        :return: tuple of (model, field name, pk) of the rows that may own path
+        """
+        if self.owners is None:
+            return ()
+        return self.owners.get(path, ())
+
+    def add_owner(self, path, model, field_name, pk):
+        if self.owners is not None and path and pk is not None:
+            owner = (model, field_name, pk)
+            owners = self.get_owners(path)
+            if owners[:1] != (owner,):
+                others = tuple(other for other in owners if other != owner)
+                self.owners.set(path, (owner,) + others[: self.max_path_owners - 1])
+
+    def remove_owner(self, path, model, field_name, pk):
+        if self.owners is not None and path:
+            owners = tuple(owner for owner in self.get_owners(path) if owner != (model, field_name, pk))
+            if owners:
+                self.owners.set(path, owners)
+            else:
+                self.owners.delete(path)
+
+    def _find_row(self, candidates, path):
+        """
+        Look up the candidates with a single ``UNION ALL`` query limited to the first match
+
+        :param candidates: list of (model, field name, pk or None for any row)
+        :return: (model, field name, pk) or None
+        """
+        querysets = []
+        for index, (model, field_name, pk) in enumerate(candidates):
+            queryset = model.objects.filter(**{field_name: path})
+            if pk is not None:
+                queryset = queryset.filter(pk=pk)
+            querysets.append(
+                queryset.order_by()
+                .annotate(dal_owner=Value(index, output_field=IntegerField()), dal_pk=Cast("pk", CharField()))
+                .values_list("dal_owner", "dal_pk")
+            )
+        queryset = querysets[0].union(*querysets[1:], all=True) if len(querysets) > 1 else querysets[0]
+        found = list(queryset[:1])
+        if not found:
+            return None
+        index, pk = found[0]
+        model, field_name, _ = candidates[index]
+        return model, field_name, model._meta.pk.to_python(pk)
+
+    def find_owner(self, user, path):
+        """
+        Find a model with a row referencing path that user may view.
+
+        Candidates are limited to the models the user has the view permission on, their rows are filtered
+        by the DAL managers. The rows indexed as owners of path are looked up first, by pk, then, if none
+        of them matches, all the models with file fields, both with a single ``UNION ALL`` query.
+
+        :return: (model, field name) or None
+        """
+        if user.is_active and user.is_superuser:
+            permissions = None
+        else:
+            permissions = user.get_all_permissions()
+
+        def may_view(model):
+            return permissions is None or (
+                "{}.view_{}".format(model._meta.app_label, model._meta.model_name) in permissions
+            )
+
+        found = None
+        indexed = [owner for owner in self.get_owners(path) if may_view(owner[0])]
+        if indexed:
+            found = self._find_row(indexed, path)
+        if found is None:
+            candidates = [(model, field_name, None) for model, field_name in self.fields if may_view(model)]
+            if not candidates:
+                return None
+            found = self._find_row(candidates, path)
+            if found is None:
+                return None
+        self.add_owner(path, *found)
+        return found[:2]
+
+    def is_allowed(self, user, path):
+        """
+        True if user may view path, i.e. ``find_owner`` finds an owner, with the decisions cached
+        by ``get_media_decision_cache``
+        """
+        decisions = get_media_decision_cache()
+        if decisions is None:
+            return self.find_owner(user, path) is not None
+        # find_owner filters the rows through the DAL managers, which depend on the context params
+        context = get_context_fingerprint()
+        if context is None:
+            return self.find_owner(user, path) is not None
+        allowed, generations = decisions.lookup(user.pk, path, context)
+        if allowed is None:
+            allowed = self.find_owner(user, path) is not None
+            decisions.store(user.pk, path, context, allowed, generations)
+        return allowed
+
+    def handle_post_save(self, sender, instance, raw=False, created=False, **kwargs):
+        decisions = get_media_decision_cache()
+        if decisions is not None and not created:
+            # the previous paths of the row are unknown, and the row may be visible to other users now
+            decisions.invalidate_all()
+        for field_name in self.get_model_fields(sender):
+            path = getattr(instance, field_name).name
+            self.add_owner(path, sender, field_name, instance.pk)
+            if decisions is not None and created and path:
+                decisions.invalidate_path(path)
+
+    def handle_post_delete(self, sender, instance, **kwargs):
+        decisions = get_media_decision_cache()
+        for field_name in self.get_model_fields(sender):
+            path = getattr(instance, field_name).name
+            self.remove_owner(path, sender, field_name, instance.pk)
+            if decisions is not None and path:
+                decisions.invalidate_path(path)
+
+
+class MediaDecisionCache:
+    """
+    Cache of the media authorization decisions by user id, path and context params (see
+    ``get_context_fingerprint``), in process or in a Django cache.
+
+    Decisions are stored with the generations of the whole cache, of the user and of the path they were
+    computed with: invalidating only replaces a generation, and decisions with an old generation are ignored.
+    Generations are random tokens, so a generation evicted from the cache never validates older decisions.
+    """
+
+    def __init__(self, alias="local", maxsize=10000, timeout=60):
+        self.alias = alias
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        if alias == "local":
+            self.decisions = LRUCache(maxsize=maxsize, timeout=timeout)
+            self.generations = LRUCache(maxsize=maxsize)
+            self.maxsize = maxsize
+        else:
+            self.decisions = self.generations = caches[alias]
+            self.maxsize = None
+
+    def _set(self, cache, key, value):
+        if self.alias == "local":
+            cache.set(key, value)
+        else:
+            cache.set(key, value, self.timeout)
+
+    def _path_key(self, path):
+        return hashlib.md5(path.encode(), usedforsecurity=False).hexdigest()
+
+    def _get_generations(self, keys):
+        if self.alias == "local":
+            generations = {key: self.generations.get(key) for key in keys}
+        else:
+            generations = self.generations.get_many(keys)
+        for key in keys:
+            if generations.get(key) is None:
+                generation = uuid.uuid4().hex
+                if self.alias == "local":
+                    self.generations.set(key, generation)
+                elif not self.generations.add(key, generation, self.timeout):
+                    # set in the meantime by another process
+                    generation = self.generations.get(key, generation)
+                generations[key] = generation
+        return tuple(generations[key] for key in keys)
+
+    def _decision_key(self, user_id, path, context):
+        return "django_dal.media.decision.{}.{}.{}".format(user_id, self._path_key(path), context)
+
+    def lookup(self, user_id, path, context=""):
+        """
+        :return: tuple of the cached decision (None if missing) and of the current generations,
+            to be passed to ``store`` with the decision computed
+        """
+        path_key = self._path_key(path)
+        generations = self._get_generations(
+            [
+                "django_dal.media.generation",
+                "django_dal.media.generation.user.{}".format(user_id),
+                "django_dal.media.generation.path.{}".format(path_key),
+            ]
+        )
+        entry = self.decisions.get(self._decision_key(user_id, path, context))
+        if entry is not None and entry[1] == generations:
+            self.hits += 1
+            return entry[0], generations
+        self.misses += 1
+        return None, generations
+
+    def store(self, user_id, path, context, allowed, generations):
+        self._set(self.decisions, self._decision_key(user_id, path, context), (allowed, generations))
+
+    def invalidate_all(self):
+        self.generations.delete("django_dal.media.generation")
+
+    def invalidate_user(self, user_id):
+        self.generations.delete("django_dal.media.generation.user.{}".format(user_id))
+
+    def invalidate_path(self, path):
+        self.generations.delete("django_dal.media.generation.path.{}".format(self._path_key(path)))
+
+    def stats(self):
+        """
+        :return: dict with hits, misses and hit ratio of this process, and size of the in process cache
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "ratio": self.hits / total if total else 0.0,
+            "size": len(self.decisions) if self.alias == "local" else None,
+            "maxsize": self.maxsize,
+        }
+
+
+class PublicRules:
+    """
+    Matcher of the public media paths in ``settings.DJANGO_DAL_RULES``, compiled on first use.
+
+    Rules whose regex is a literal prefix (e.g. ``^public/``) are checked with a single ``str.startswith``,
+    the others are combined in a single alternation, or matched one by one if they can not be combined
+    (e.g. inline flags or duplicated group names).
+    """
+
+    METACHARS = frozenset(".^$*+?{}[]\\|()")
+
+    def __init__(self):
+        self.compiled = None
+
+    def compile(self, rules):
+        prefixes = []
+        patterns = []
+        for rule in rules:
+            if "regex" not in rule:
+                continue
+            regex = rule["regex"]
+            body = regex[1:] if regex.startswith("^") else regex
+            if not self.METACHARS.intersection(body):
+                prefixes.append(body)
+            else:
+                patterns.append(regex)
+        if len(patterns) > 1:
+            try:
+                patterns = [re.compile("|".join("(?:{})".format(pattern) for pattern in patterns))]
+            except re.error:
+                patterns = [re.compile(pattern) for pattern in patterns]
+        else:
+            patterns = [re.compile(pattern) for pattern in patterns]
+        return tuple(prefixes), patterns
+
+    def match(self, path):
+        """
+        :param path: normalized path, relative to MEDIA_ROOT
+        :return: True if path matches a rule
+        """
+        if self.compiled is None:
+            self.compiled = self.compile(getattr(settings, "DJANGO_DAL_RULES", []))
+        prefixes, patterns = self.compiled
+        if prefixes and path.startswith(prefixes):
+            return True
+        return any(pattern.match(path) for pattern in patterns)
+
+    def reset(self):
+        self.compiled = None
+
+
+#: query string parameter of the signed media urls
+SIGNATURE_PARAM = "dal_sig"
+
+
+def _get_media_signer(path):
+    # the path is in the salt, so a signature is valid for a single file
+    return signing.TimestampSigner(salt="django_dal.media:{}".format(path))
+
+
+def _get_signature_binding(request):
+    """
+    Value the signatures are bound to: the session key (default, read from the cookie without queries)
+    or the user pk, as set in settings.DJANGO_DAL_MEDIA_SIGNATURE_BINDING
+    """
+    if getattr(settings, "DJANGO_DAL_MEDIA_SIGNATURE_BINDING", "session") == "user":
+        user = getattr(request, "user", None)
+        return str(user.pk) if user is not None and user.is_authenticated else None
+    session = getattr(request, "session", None)
+    return session.session_key if session is not None else None
+
+
+def sign_media_path(request, path):
+    """
+    Time limited signature of a media path for the session (or user) of request,
+    to be checked by ``BaseSendFileView`` instead of the permissions.
+    The caller is responsible to sign only the paths the user may view.
+
+    :param path: path relative to MEDIA_ROOT, e.g. ``instance.file.name``
+    :return: signature, or None if request has no session (or authenticated user)
+    """
+    binding = _get_signature_binding(request)
+    if not binding:
+        return None
+    # the binding is not part of the signature sent to the client
+    return _get_media_signer(path).sign(binding)[len(binding) + 1 :]
+
+
+def get_signed_media_url(request, path, viewname="media_django_mal"):
+    """
+    Url of path served by ``BaseSendFileView`` with its signature, or without it if the path can not be signed
+
+    e.g. <img src="{{ signed_url }}"> with signed_url = get_signed_media_url(request, instance.image.name)
+
+    :param viewname: name of the url of the view, e.g. with the namespace of the included django_dal.urls
+    """
+    url = reverse(viewname, kwargs={"path": path})
+    signature = sign_media_path(request, path)
+    if signature is None:
+        return url
+    return "{}?{}={}".format(url, SIGNATURE_PARAM, quote(signature))
+
+
+def check_media_signature(request, path, signature):
+    """
+    :return: True if signature of path is valid for request and is not older than
+        settings.DJANGO_DAL_MEDIA_SIGNATURE_MAX_AGE seconds (default 300)
+    """
+    binding = _get_signature_binding(request)
+    if not binding or not signature:
+        return False
+    try:
+        _get_media_signer(path).unsign(
+            "{}:{}".format(binding, signature), max_age=getattr(settings, "DJANGO_DAL_MEDIA_SIGNATURE_MAX_AGE", 300)
+        )
+    except signing.BadSignature:
+        return False
+    return True
+
+
+media_registry = MediaRegistry()
+public_rules = PublicRules()
+media_decision_cache = None
+
+
+def get_media_decision_cache():
+    """
+    Cache of the media authorization decisions, configured with settings
+    ``DJANGO_DAL_MEDIA_DECISION_CACHE`` ("local" by default for an in process cache, the alias of a Django cache
+    or None to disable it), ``DJANGO_DAL_MEDIA_DECISION_CACHE_SIZE`` (in process only, default 10000) and
+    ``DJANGO_DAL_MEDIA_DECISION_CACHE_TIMEOUT`` (seconds, default 60), the timeout bounds how long changes not
+    signaled, e.g. to the rows the file models are filtered by, or made by other processes with the in process
+    cache, may go unnoticed.
+
+    :return: MediaDecisionCache or None
+    """
+    global media_decision_cache
+    if media_decision_cache is None:
+        alias = getattr(settings, "DJANGO_DAL_MEDIA_DECISION_CACHE", "local")
+        if alias is None:
+            return None
+        media_decision_cache = MediaDecisionCache(
+            alias,
+            maxsize=getattr(settings, "DJANGO_DAL_MEDIA_DECISION_CACHE_SIZE", 10000),
+            timeout=getattr(settings, "DJANGO_DAL_MEDIA_DECISION_CACHE_TIMEOUT", 60),
+        )
+    return media_decision_cache
+
+
+# context params values used as they are in the decision keys
+KEY_TYPES = (str, int, float, bool, bytes, Decimal, uuid.UUID, datetime.date, datetime.time, datetime.timedelta)
+
+
+def get_context_fingerprint():
+    """
+    Digest of the current context params values: model instances by label and pk, None and scalar values
+    (``KEY_TYPES``) as they are. Lazy params are resolved, since the filters of the DAL managers may read them.
+
+    :return: digest, or None if a value can not be keyed this way, e.g. a queryset or an unsaved instance
+    """
+    values = []
+    for name, value in get_context_params().get().items():
+        if isinstance(value, Model):
+            if value.pk is None:
+                return None
+            value = (value._meta.label, value.pk)
+        elif value is not None and not isinstance(value, KEY_TYPES):
+            return None
+        values.append((name, value))
+    return hashlib.md5(repr(values).encode(), usedforsecurity=False).hexdigest()
+
+
+def invalidate_media_decisions(sender, instance=None, action=None, reverse=False, pk_set=None, **kwargs):
+    """
+    Receiver of ``m2m_changed`` for ``User.groups``, ``User.user_permissions`` and ``Group.permissions``,
+    of ``post_save`` for ``User`` and of ``post_delete`` for ``Group``
+    """
+    if action is not None and not action.startswith("post_"):
+        return
+    decisions = get_media_decision_cache()
+    if decisions is None:
+        return
+    user_model = get_user_model()
+    if isinstance(instance, user_model):
+        decisions.invalidate_user(instance.pk)
+    elif reverse and pk_set is not None and sender in (user_model.groups.through, user_model.user_permissions.through):
+        for pk in pk_set:
+            decisions.invalidate_user(pk)
+    else:
+        decisions.invalidate_all()
+
+
+@receiver(setting_changed)
+def reset_media_settings(setting, **kwargs):
+    global media_decision_cache
+    if setting == "DJANGO_DAL_RULES":
+        public_rules.reset()
+    elif setting in (
+        "DJANGO_DAL_MEDIA_DECISION_CACHE",
+        "DJANGO_DAL_MEDIA_DECISION_CACHE_SIZE",
+        "DJANGO_DAL_MEDIA_DECISION_CACHE_TIMEOUT",
+    ):
+        media_decision_cache = None
@@ -1,12 +1,23 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
 from django_dal.params import get_context_params
 
 
 class ContextParamsMiddleware:
+    sync_capable = True
+    async_capable = True
 
     def __init__(self, get_response):
         self.get_response = get_response
+        self.async_mode = iscoroutinefunction(self.get_response)
+        if self.async_mode:
+            # Mark the class as async-capable, but do the actual switch inside __call__
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
         context_params = get_context_params()
         context_params.set_to_none()
         context_params.set_from_request(request)
@@ -14,3 +25,14 @@ class ContextParamsMiddleware:
 
         response = self.get_response(request)
         return response
+
+    async def __acall__(self, request):
+        # params are set in the context of the request task,
+        # they are copied to the tasks and sync_to_async calls of the view
+        context_params = get_context_params()
+        context_params.set_to_none()
+        await context_params.aset_from_request(request)
+        await context_params.aset_from_request_post(request)
+
+        response = await self.get_response(request)
+        return response
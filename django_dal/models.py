@@ -4,21 +4,22 @@ from mptt.models import MPTTModel
 
 from django_dal.managers import DALManager
 from django_dal.mptt_managers import DALTreeManager
-from django_dal.utils import check_permission
+from django_dal.utils import check_permission, permission_scope
 
 if apps.is_installed("django.contrib.gis"):
     from django.contrib.gis.db.models import Model
 else:
     from django.db.models import Model
 
-# Add `relations_limit` attribute to Meta class
+# Add `relations_limit` and `relations_limit_mode` attributes to Meta class
 
 test_1 = hasattr(models, "options")
 test_2 = hasattr(models.options, "DEFAULT_NAMES")
-test_3 = "relations_limit" not in models.options.DEFAULT_NAMES
 
-if test_1 and test_2 and test_3:
-    models.options.DEFAULT_NAMES += ("relations_limit",)
+if test_1 and test_2:
+    for name in ("relations_limit", "relations_limit_mode"):
+        if name not in models.options.DEFAULT_NAMES:
+            models.options.DEFAULT_NAMES += (name,)
 
 
 class DALModel(Model):
@@ -28,6 +29,17 @@ class DALModel(Model):
         relations_limit = []
         abstract = True
 
+    @classmethod
+    def permission_scope(cls, perm_names=("add", "change", "delete")):
+        """
+        Context manager checking the model permissions once for all the objects saved or deleted in the block
+
+        with MyModel.permission_scope():
+            for obj in objs:
+                obj.save()
+        """
+        return permission_scope(cls, perm_names)
+
     def save(self, force_insert=False, force_update=False, using=None, update_fields=None, *args, **kwargs):
 
         if self.pk is None:
@@ -58,6 +70,17 @@ class DALMPTTModel(MPTTModel):
         relations_limit = []
         abstract = True
 
+    @classmethod
+    def permission_scope(cls, perm_names=("add", "change", "delete")):
+        """
+        Context manager checking the model permissions once for all the objects saved or deleted in the block
+
+        with MyModel.permission_scope():
+            for obj in objs:
+                obj.save()
+        """
+        return permission_scope(cls, perm_names)
+
     def save(self, force_insert=False, force_update=False, using=None, update_fields=None, *args, **kwargs):
 
         if self.pk is None:
@@ -5,7 +5,6 @@ A custom manager for working with trees of objects.
 import contextlib
 import functools
 from builtins import Exception
-from inspect import signature
 from itertools import groupby
 
 from django.db import connections, models, router
@@ -17,7 +16,8 @@ from mptt.signals import node_moved
 from mptt.utils import _get_tree_model
 
 from django_dal.query import DALTreeQuerySet
-from django_dal.utils import check_permission
+from django_dal.relations import apply_filter, get_filter_plan
+from django_dal.utils import accepts_argument, check_permission
 
 __all__ = ("DALTreeManager",)
 
@@ -93,21 +93,8 @@ class DALTreeManager(models.Manager.from_queryset(DALTreeQuerySet)):
                 # _base_manager is the treemanager on tree_model
                 self._base_manager = self.tree_model._tree_manager
 
-    def _add_prefix(self, qset, prefix):
-        # Recursive add prefix
-        if isinstance(qset, Q) and hasattr(qset, "children"):
-            self._add_prefix(qset.children, prefix)
-        # Add prefix
-        elif isinstance(qset, list):
-            for idx, q in enumerate(qset):
-                if isinstance(q, tuple):
-                    qset[idx] = ("{}__{}".format(prefix, q[0]), q[1])
-                elif isinstance(q, Q) and hasattr(q, "children"):
-                    self._add_prefix(q.children, prefix)
-
     def all(self, ignore_filters=False):
-        sig = signature(self.get_queryset)
-        if sig.parameters.get("ignore_filters", None) is not None:
+        if accepts_argument(type(self), "get_queryset", "ignore_filters"):
             return self.get_queryset(ignore_filters=ignore_filters)
         else:
             return self.get_queryset()
@@ -119,23 +106,16 @@ class DALTreeManager(models.Manager.from_queryset(DALTreeQuerySet)):
             super(DALTreeManager, self).get_queryset(*args, **kwargs).order_by(self.tree_id_attr, self.left_attr)
         )
         if ignore_filters is False:
-            queryset = queryset.filter(self.get_filter())
+            queryset = apply_filter(queryset, self.get_filter())
+        queryset._dal_filtered = True
         return queryset
 
     def get_filter(self, relations_limit=None):
-        qsets = Q()
-
-        if hasattr(self.model._meta, "relations_limit") and isinstance(self.model._meta.relations_limit, list):
-            for relation_limit in self.model._meta.relations_limit:
-                model = self._get_model(self.model, relation_limit)
-
-                if model is not None and hasattr(model.objects, "get_filter") and callable(model.objects.get_filter):
-                    filters = model.objects.get_filter()
-                    if isinstance(filters, Q):
-                        self._add_prefix(qset=filters, prefix=relation_limit)
-                        qsets &= filters
-
-        return qsets
+        if relations_limit is None:
+            relations_limit = getattr(self.model._meta, "relations_limit", None)
+            if not isinstance(relations_limit, list):
+                return Q()
+        return get_filter_plan(self.model, relations_limit).bind()
 
     def _get_queryset_relatives(self, queryset, direction, include_self):
         """
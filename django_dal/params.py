@@ -1,66 +1,247 @@
+import copy
 import importlib
 from collections import OrderedDict
 from contextvars import ContextVar, copy_context
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.utils.functional import LazyObject
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.functional import LazyObject, empty
+
+from django_dal.cache import LRUCache, SharedCache
 
 
 class ContextParam:
 
-    def __init__(self, name, type, description, default=None):
+    def __init__(self, name, type, description, default=None, resolver=None):
         self.name = name
         self.type = type  # may be class or list of classes, e.g. AnonymousUser is not subclass of User
         self.description = description
         self.default = default
+        # optional callable receiving the request, to resolve the value lazily on first access
+        self.resolver = resolver
+
+
+class LazyParamValue:
+    """
+    Value of a param resolved on first access and then memoized, also for the contexts copied before
+    """
+
+    __slots__ = ("resolver", "request", "resolved", "value")
+
+    def __init__(self, resolver, request):
+        self.resolver = resolver
+        self.request = request
+        self.resolved = False
+        self.value = None
+
+    def resolve(self):
+        if not self.resolved:
+            self.value = self.resolver(self.request)
+            self.resolved = True
+            self.request = None
+        return self.value
+
+
+class ContextVarsStorage:
+    """
+    Store each param in its own ContextVar
+    """
+
+    def __init__(self, params):
+        self.vars = OrderedDict((param.name, ContextVar(param.name, default=param.default)) for param in params)
+
+    def get(self, name):
+        return self.vars[name].get()
+
+    def getter(self, name):
+        return self.vars[name].get
+
+    def items(self):
+        return [(name, variable.get()) for name, variable in self.vars.items()]
+
+    def assign(self, values, base=None):
+        """
+        :param values: dict of values by param name
+        :param base: optional values of all params, by param position, to set before values
+        """
+        if base is not None:
+            for variable, value in zip(self.vars.values(), base):
+                variable.set(value)
+        for name, value in values.items():
+            self.vars[name].set(value)
+
+
+class SnapshotStorage:
+    """
+    Store the values of all params in a single ContextVar, as a tuple indexed by param position,
+    so that resetting or setting many params is a single ``ContextVar.set()``
+    """
+
+    def __init__(self, params):
+        self.names = [param.name for param in params]
+        self.index = {name: index for index, name in enumerate(self.names)}
+        self.var = ContextVar("context_params", default=tuple(param.default for param in params))
+
+    def get(self, name):
+        return self.var.get()[self.index[name]]
+
+    def getter(self, name):
+        index = self.index[name]
+        get = self.var.get
+        return lambda: get()[index]
+
+    def items(self):
+        return list(zip(self.names, self.var.get()))
+
+    def assign(self, values, base=None):
+        snapshot = list(self.var.get() if base is None else base)
+        for name, value in values.items():
+            snapshot[self.index[name]] = value
+        self.var.set(tuple(snapshot))
+
+
+class ContextParamDescriptor:
+    """
+    Read a param of a ContextParams instance, generated for each param so that
+    reading it does not go through ``ContextParams.__getattr__``
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        return instance.__dict__["storage"].get(self.name)
+
+
+class LazyContextParamDescriptor(ContextParamDescriptor):
+    """
+    Read a param with a resolver, resolving its value on first access
+    """
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        return instance._resolve(self.name, instance.__dict__["storage"].get(self.name))
 
 
 class ContextParams:
     #: List of ContextParam instances
     params = []
+    #: Store all params in a single ContextVar snapshot instead of one ContextVar per param
+    snapshot_storage = False
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._index_params()
+        for param in cls.params:
+            # replace the descriptors inherited from a parent class, which may declare the param differently
+            inherited = getattr(cls, param.name, None)
+            if param.name not in cls.__dict__ and (inherited is None or isinstance(inherited, ContextParamDescriptor)):
+                descriptor_class = ContextParamDescriptor if param.resolver is None else LazyContextParamDescriptor
+                setattr(cls, param.name, descriptor_class(param.name))
+
+    @classmethod
+    def _index_params(cls):
+        """
+        Index params by name, with the tuple of types each param accepts
+        """
+        cls._params_by_name = {param.name: param for param in cls.params}
+        cls._param_types = {
+            param.name: tuple(param.type) if isinstance(param.type, (list, tuple)) else (param.type,)
+            for param in cls.params
+        }
+        cls._lazy_params = [param for param in cls.params if param.resolver is not None]
 
     def __init__(self):
-        self.__dict__["vars"] = {}
-        for param in self.params:
-            self.__dict__["vars"][param.name] = ContextVar(param.name, default=param.default)
+        storage_class = SnapshotStorage if self.snapshot_storage else ContextVarsStorage
+        self.__dict__["storage"] = storage_class(self.params)
+        # permission decisions of a user object as (user, LRUCache), reset together with the params
+        self.__dict__["permission_cache"] = ContextVar("permission_cache", default=None)
 
     def __getattr__(self, name):
         try:
-            return self.__dict__["vars"][name].get()
+            return self._resolve(name, self.__dict__["storage"].get(name))
         except KeyError:
             raise AttributeError
 
+    def _resolve(self, name, value):
+        """
+        Resolve a lazy value of param ``name`` and store it in the current context
+        """
+        if isinstance(value, LazyParamValue):
+            value = self._check(name, value.resolve())
+            self.__dict__["storage"].assign({name: value})
+        return value
+
     def __setattr__(self, name, value):
-        self.__dict__["vars"][name].set(value)
+        if name == "user":
+            self.__dict__["permission_cache"].set(None)
+        self.__dict__["storage"].assign({name: value})
+
+    def get_getters(self):
+        """
+        :return: dict of callables without arguments returning the value of each param, by param name
+        """
+        getters = {param.name: self.__dict__["storage"].getter(param.name) for param in self.params}
+        for param in self._lazy_params:
+            getters[param.name] = lambda name=param.name, getter=getters[param.name]: self._resolve(name, getter())
+        return getters
 
     def _get_param(self, name):
-        for param in self.params:
-            if param.name == name:
-                return param
-        raise Exception("Param {} does not exist in ContextParams".format(name))
+        try:
+            return self._params_by_name[name]
+        except KeyError:
+            raise Exception("Param {} does not exist in ContextParams".format(name))
 
     def set_defaults(self):
         """
         Reset to default values
         :return:
         """
-        for name, variable in self.__dict__["vars"].items():
-            param = self._get_param(name)
-            self.__dict__["vars"][name].set(param.default)
+        self.__dict__["storage"].assign({}, base=[param.default for param in self.params])
+        self.__dict__["permission_cache"].set(None)
 
     def set_to_none(self):
         """
-        Set all params to None
+        Set all params to None and clear the permission cache
         :return:
         """
-        for name, variable in self.__dict__["vars"].items():
-            self.__dict__["vars"][name].set(None)
+        self.__dict__["storage"].assign({}, base=[None] * len(self.params))
+        self.__dict__["permission_cache"].set(None)
+
+    def get_permission_cache(self, user):
+        """
+        Permission decisions cache of user in the current context, see ``django_dal.utils.check_permission``.
+        Decisions belong to the user object, as the permissions cached by Django on it:
+        another object, e.g. the same user loaded again, starts with an empty cache.
+
+        :return: LRUCache
+        """
+        entry = self.__dict__["permission_cache"].get()
+        if entry is None or entry[0] is not user:
+            entry = (user, LRUCache(maxsize=4096))
+            self.__dict__["permission_cache"].set(entry)
+        return entry[1]
 
     def get_from_request(self, request):
         return {}
 
     def set_from_request(self, request):
-        self.set(self.get_from_request(request))
+        self.set(self._add_resolvers(self.get_from_request(request), request))
+
+    def _add_resolvers(self, values, request):
+        """
+        Add a lazy value for each param with a resolver and without a value
+        """
+        values = dict(values)
+        for param in self._lazy_params:
+            if param.name not in values:
+                values[param.name] = LazyParamValue(param.resolver, request)
+        return values
 
     def get_from_request_post(self, request):
         return {}
@@ -68,44 +249,119 @@ class ContextParams:
     def set_from_request_post(self, request):
         self.set_post(self.get_from_request_post(request))
 
-    def _set(self, values):
+    @staticmethod
+    def _evaluate(values):
+        """
+        Evaluate the lazy objects of values, e.g. request.user, which may query the database
+        """
+        evaluated = {}
         for name, value in values.items():
-            param = self._get_param(name)  # raises exception if does not exist
-            # e.g. request.user in middleware may LazyObject
-            if isinstance(value, LazyObject) and hasattr(value, "_wrapped"):
+            if issubclass(type(value), LazyObject):
+                if value._wrapped is empty:
+                    value._setup()
                 value = value._wrapped
-            if value is not None and not isinstance(value, param.type):
-                raise Exception(
-                    "Trying to set ContextParam {} to value {} of type {} which does not match param type {}".format(
-                        name, value, type(value), param.type
-                    )
+            evaluated[name] = value
+        return evaluated
+
+    @staticmethod
+    def _has_lazy_objects(values):
+        # type() instead of isinstance(), which evaluates lazy objects
+        return any(issubclass(type(value), LazyObject) and value._wrapped is empty for value in values.values())
+
+    async def _aevaluate(self, values):
+        if self._has_lazy_objects(values):
+            return await sync_to_async(self._evaluate)(values)
+        return values
+
+    def _get_evaluated(self, function, request):
+        return self._evaluate(function(request))
+
+    async def aget_from_request(self, request):
+        """
+        Async version of ``get_from_request``, by default it runs ``get_from_request`` in a thread
+        (which may query the database) if it is overridden, lazy objects are evaluated there too
+        """
+        if type(self).get_from_request is ContextParams.get_from_request:
+            return {}
+        return await sync_to_async(self._get_evaluated)(self.get_from_request, request)
+
+    async def aset_from_request(self, request):
+        values = await self._aevaluate(await self.aget_from_request(request))
+        self.set(self._add_resolvers(values, request))
+
+    async def aget_from_request_post(self, request):
+        """
+        Async version of ``get_from_request_post``, see ``aget_from_request``
+        """
+        if type(self).get_from_request_post is ContextParams.get_from_request_post:
+            return {}
+        return await sync_to_async(self._get_evaluated)(self.get_from_request_post, request)
+
+    async def aset_from_request_post(self, request):
+        self.set_post(await self._aevaluate(await self.aget_from_request_post(request)))
+
+    def _check(self, name, value):
+        param = self._get_param(name)  # raises exception if does not exist
+        # e.g. request.user in middleware may LazyObject
+        if isinstance(value, LazyObject) and hasattr(value, "_wrapped"):
+            value = value._wrapped
+        if value is not None and not isinstance(value, self._param_types[name]):
+            raise Exception(
+                "Trying to set ContextParam {} to value {} of type {} which does not match param type {}".format(
+                    name, value, type(value), param.type
                 )
-            self.__dict__["vars"][name].set(value)
+            )
+        return value
+
+    def _set(self, values, base=None):
+        checked = {}
+        for name, value in values.items():
+            # lazy values are checked when resolved
+            checked[name] = value if isinstance(value, LazyParamValue) else self._check(name, value)
+        self.__dict__["storage"].assign(checked, base=base)
 
     def set(self, values):
-        self.set_to_none()
-        self._set(values)
+        self.__dict__["permission_cache"].set(None)
+        try:
+            # reset all params to None and set values at once
+            self._set(values, base=[None] * len(self.params))
+        except Exception:
+            self.set_to_none()
+            raise
 
     def set_post(self, values):
+        if "user" in values:
+            self.__dict__["permission_cache"].set(None)
         self._set(values)
 
     def get(self):
-        vars = OrderedDict()
-        for param in self.params:
-            value = self.__dict__["vars"][param.name].get()
-            vars[param.name] = value
-        return vars
+        return OrderedDict((name, self._resolve(name, value)) for name, value in self.__dict__["storage"].items())
 
     @staticmethod
     def get_user_group(user):
+        """
+        Group of user, None if the user is in no group.
+        Groups are cached on the user object and in a process cache by user id, see ``get_user_group_cache``.
+
+        :raises Exception: if the user is in more groups
+        """
         if user is None:
             return None
-        groups = user.groups.get_queryset()
-        if len(groups) == 0:
-            return None
-        elif len(groups) == 1:
-            return groups[0]
-        raise Exception("User {} in more groups: {}".format(user.username, groups))
+        group = getattr(user, "_dal_group_cache", _missing)
+        if group is not _missing:
+            return group
+        cache = get_user_group_cache()
+        group = cache.get(user.pk, _missing) if user.pk is not None else _missing
+        if group is _missing:
+            groups = list(user.groups.all()[:2])
+            if len(groups) > 1:
+                raise Exception("User {} in more groups: {}".format(user.username, groups))
+            group = groups[0] if groups else None
+            if user.pk is not None:
+                cache.set(user.pk, group)
+        # the cached group is shared between threads, give each user object its own copy
+        user._dal_group_cache = copy.copy(group)
+        return user._dal_group_cache
 
     # this is run in context copy
     @staticmethod
@@ -135,7 +391,7 @@ class ContextParams:
     def describe(self):
         vars = []
         for param in self.params:
-            value = self.__dict__["vars"][param.name].get()
+            value = self._resolve(param.name, self.__dict__["storage"].get(param.name))
             vars.append(
                 "{}: {} ({}, type={}, default={})".format(
                     param.name, value, param.description, param.type, param.default
@@ -144,16 +400,52 @@ class ContextParams:
         return "\n".join(vars)
 
 
+ContextParams._index_params()
+
+
 # Proxy pattern from
 # http://jtushman.github.io/blog/2014/05/02/module-properties/
 class ModuleProperty(object):
 
     def __init__(self, get_property_function):
         self.function = get_property_function
+        self.target = None
+
+    def bind(self):
+        """
+        Execute function once and bind its result. Context params are exposed as generated properties
+        of the proxy class, so that reading them costs a single ContextVar lookup.
+        """
+        self.target = self.function()
+        getters = self.target.get_getters() if hasattr(self.target, "get_getters") else {}
+        namespace = {
+            name: property(lambda self, getter=getter: getter())
+            for name, getter in getters.items()
+            if not hasattr(ModuleProperty, name)
+        }
+        self.__class__ = type(ModuleProperty.__name__, (ModuleProperty,), namespace)
+
+    def reset(self):
+        """
+        Forget the bound property, e.g. when settings change
+        """
+        self.__class__ = ModuleProperty
+        self.target = None
 
     def __getattr__(self, name):
-        # execute function and get its attribute
-        return getattr(self.function(), name)
+        if self.target is None:
+            self.bind()
+            return getattr(self, name)
+        return getattr(self.target, name)
+
+    def __setattr__(self, name, value):
+        if name in ("function", "target", "__class__"):
+            super().__setattr__(name, value)
+            return
+        # assign to the bound object, also before the first read
+        if self.target is None:
+            self.bind()
+        setattr(self.target, name, value)
 
     def __str__(self):
         return str([(i.name, getattr(self, i.name)) for i in self.params])
@@ -167,6 +459,11 @@ def cxpr():
 # Context params global instance
 context_params = None
 
+# Groups by user id, see ContextParams.get_user_group
+user_group_cache = None
+
+_missing = object()
+
 
 def get_context_params():
     global context_params
@@ -180,3 +477,52 @@ def get_context_params():
         else:
             context_params = ContextParams()
     return context_params
+
+
+def get_user_group_cache():
+    """
+    Cache of the groups by user id, configured with settings
+    ``DJANGO_DAL_GROUP_CACHE`` ("local" by default for a process cache, or the alias of a Django cache shared by
+    the processes), ``DJANGO_DAL_GROUP_CACHE_SIZE`` (process cache only, default 1024) and
+    ``DJANGO_DAL_GROUP_CACHE_TIMEOUT`` (seconds, default 60). With the process cache the timeout bounds how long
+    changes made by other processes may go unnoticed.
+    """
+    global user_group_cache
+    if user_group_cache is None:
+        alias = getattr(settings, "DJANGO_DAL_GROUP_CACHE", "local")
+        timeout = getattr(settings, "DJANGO_DAL_GROUP_CACHE_TIMEOUT", 60)
+        if alias == "local":
+            user_group_cache = LRUCache(
+                maxsize=getattr(settings, "DJANGO_DAL_GROUP_CACHE_SIZE", 1024), timeout=timeout
+            )
+        else:
+            user_group_cache = SharedCache(alias, "django_dal.group", timeout=timeout)
+    return user_group_cache
+
+
+def invalidate_user_group_cache(sender, instance=None, action=None, reverse=False, pk_set=None, **kwargs):
+    """
+    Receiver of ``m2m_changed`` for ``User.groups`` and of ``post_save``/``post_delete`` for ``Group``
+    """
+    if action is not None and not action.startswith("post_"):
+        return
+    cache = get_user_group_cache()
+    if action is None or (reverse and pk_set is None):
+        # group changed or removed from all its users
+        cache.clear()
+    elif reverse:
+        for pk in pk_set:
+            cache.delete(pk)
+    else:
+        cache.delete(instance.pk)
+        instance.__dict__.pop("_dal_group_cache", None)
+
+
+@receiver(setting_changed)
+def reset_context_params(setting, **kwargs):
+    global context_params, user_group_cache
+    if setting == "CONTEXT_PARAMS":
+        context_params = None
+        cxpr.reset()
+    elif setting in ("DJANGO_DAL_GROUP_CACHE", "DJANGO_DAL_GROUP_CACHE_SIZE", "DJANGO_DAL_GROUP_CACHE_TIMEOUT"):
+        user_group_cache = None
@@ -1,31 +1,214 @@
+from django.db import connections, transaction
+from django.db.models import Q
 from django.db.models.query import QuerySet
 from django.db.models.utils import resolve_callables
 from mptt.querysets import TreeQuerySet
 
+from django_dal.relations import apply_filter
 from django_dal.utils import check_permission
 
+# marks the existing rows out of the scope of a queryset, see DALQuerySet._get_existing_pks
+_out_of_scope = object()
+
 
 class DALQuerySet(QuerySet):
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # True once the relations_limit filter of the manager is applied, or explicitly ignored
+        self._dal_filtered = False
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._dal_filtered = self._dal_filtered
+        return clone
+
+    def _scoped(self):
+        """
+        This queryset limited by the filter of the model manager, if not already applied by the manager,
+        so that writes never reach rows outside the relations_limit scope
+        """
+        if self._dal_filtered:
+            return self
+        manager = getattr(self.model, "objects", None)
+        if not callable(getattr(manager, "get_filter", None)):
+            return self
+        queryset = apply_filter(self, manager.get_filter())
+        queryset._dal_filtered = True
+        return queryset
+
     def update(self, **kwargs):
         # raise exception if no permission
         check_permission(self.model, "change")
-        return super().update(**kwargs)
+        # the scope filter is in the UPDATE WHERE clause, rows out of scope are not counted
+        return super(DALQuerySet, self._scoped()).update(**kwargs)
 
     def delete(self):
         # raise exception if no permission
         check_permission(self.model, "delete")
-        return super().delete()
+        return super(DALQuerySet, self._scoped()).delete()
 
-    def bulk_create(self, objs, batch_size=None, ignore_conflicts=False):
+    def bulk_create(
+        self,
+        objs,
+        batch_size=None,
+        ignore_conflicts=False,
+        update_conflicts=False,
+        update_fields=None,
+        unique_fields=None,
+    ):
         # raise exception if no permission
         check_permission(self.model, "add")
-        return super().bulk_create(objs, batch_size=batch_size, ignore_conflicts=ignore_conflicts)
+        if update_conflicts:
+            check_permission(self.model, "change")
+        return super().bulk_create(
+            objs,
+            batch_size=batch_size,
+            ignore_conflicts=ignore_conflicts,
+            update_conflicts=update_conflicts,
+            update_fields=update_fields,
+            unique_fields=unique_fields,
+        )
 
     def bulk_update(self, objs, fields, batch_size=None):
         # raise exception if no permission
         check_permission(self.model, "change")
-        return super().bulk_update(objs, fields, batch_size=batch_size)
+        # each batch is an update() of the scoped queryset
+        return super(DALQuerySet, self._scoped()).bulk_update(objs, fields, batch_size=batch_size)
+
+    def stream(self, chunk_size=2000, keyset_on="pk", fields=None):
+        """
+        Iterate over the queryset in chunks with keyset pagination (``WHERE key > last key``, never OFFSET),
+        each chunk is a new query from this queryset so its filters, e.g. the relations_limit filter of the
+        manager, and its prefetch_related are applied to every chunk, and memory is bounded by chunk_size.
+
+        Rows are ordered by the column of keyset_on (for a foreign key its id, not the related model ordering),
+        then by pk if keyset_on is not unique, so that rows with the same key are never skipped.
+
+        :param chunk_size: number of rows fetched by each query
+        :param keyset_on: not nullable field to paginate on, e.g. "pk" or "-created" for descending order
+        :param fields: optional list of field names, to yield values_list tuples instead of model instances
+        :raises ValueError: if keyset_on is nullable
+        :return: generator
+        """
+        descending = keyset_on.startswith("-")
+        key = keyset_on.lstrip("-")
+        field = self.model._meta.pk if key == "pk" else self.model._meta.get_field(key)
+        if field.null:
+            raise ValueError("stream() keyset_on {} must not be nullable".format(key))
+        attname = "pk" if key == "pk" else field.attname
+        unique = field.primary_key or field.unique
+        direction = "lt" if descending else "gt"
+
+        order_by = [attname] if unique else [attname, "pk"]
+        queryset = self.order_by(*("-{}".format(name) if descending else name for name in order_by))
+        if fields is not None:
+            queryset = queryset.values_list(attname, "pk", *fields)
+
+        last = None
+        while True:
+            if last is None:
+                chunk = queryset
+            elif unique:
+                chunk = queryset.filter(**{"{}__{}".format(attname, direction): last[0]})
+            else:
+                chunk = queryset.filter(
+                    Q(**{"{}__{}".format(attname, direction): last[0]})
+                    | Q(**{attname: last[0], "pk__{}".format(direction): last[1]})
+                )
+            rows = list(chunk[:chunk_size])
+            for row in rows:
+                yield row[2:] if fields is not None else row
+            if len(rows) < chunk_size:
+                return
+            last = rows[-1][:2] if fields is not None else (getattr(rows[-1], attname), rows[-1].pk)
+
+    def bulk_upsert(self, objs, unique_fields, update_fields, batch_size=1000):
+        """
+        Create objs, or update the update_fields of the existing rows with the same unique_fields.
+
+        Permissions are checked once. Where the database supports it, each batch is a single
+        ``INSERT ... ON CONFLICT DO UPDATE``, otherwise each batch is a bulk_update of the existing rows and a
+        bulk_create of the others. One query per batch looks up the existing rows, and one more, only if some
+        exist, checks which of them are in the scope of this queryset (e.g. the relations_limit filter of the
+        manager): objs matching rows out of the scope are skipped, neither created nor updated.
+        Objs with the same unique_fields values are deduplicated, the last one is saved.
+
+        :param objs: model instances
+        :param unique_fields: names of the fields identifying a row, e.g. ["code"]
+        :param update_fields: names of the fields to update on existing rows
+        :param batch_size: number of objects per batch
+        :return: tuple of created and updated counts
+        """
+        # raise exception if no permission
+        check_permission(self.model, "add")
+        check_permission(self.model, "change")
+
+        opts = self.model._meta
+        unique_attnames = [opts.pk.attname if name == "pk" else opts.get_field(name).attname for name in unique_fields]
+        native = connections[self.db].features.supports_update_conflicts_with_target
+        objs = self._deduplicate(objs, unique_attnames)
+        created = updated = 0
+        with transaction.atomic(using=self.db, savepoint=False):
+            for start in range(0, len(objs), batch_size):
+                existing = self._get_existing_pks(objs[start : start + batch_size], unique_attnames)
+                to_update = []
+                to_create = []
+                for obj in objs[start : start + batch_size]:
+                    pk = existing.get(tuple(getattr(obj, name) for name in unique_attnames))
+                    if pk is None:
+                        to_create.append(obj)
+                    elif pk is not _out_of_scope:
+                        if not native:
+                            obj.pk = pk
+                        to_update.append(obj)
+                if native:
+                    if to_create or to_update:
+                        super().bulk_create(
+                            to_create + to_update,
+                            update_conflicts=True,
+                            unique_fields=unique_fields,
+                            update_fields=update_fields,
+                        )
+                    updated += len(to_update)
+                    created += len(to_create)
+                else:
+                    if to_update:
+                        updated += super().bulk_update(to_update, update_fields)
+                    if to_create:
+                        created += len(super().bulk_create(to_create))
+        return created, updated
+
+    def _deduplicate(self, objs, attnames):
+        """
+        :return: list of objs with the last one of those with the same attnames values, at the position of the first
+        """
+        unique = {}
+        for index, obj in enumerate(objs):
+            key = tuple(getattr(obj, name) for name in attnames)
+            # NULL values never conflict
+            unique[index if None in key else key] = obj
+        return list(unique.values())
+
+    def _get_existing_pks(self, objs, attnames):
+        """
+        :return: dict of the pks of the existing rows by their attnames values,
+            ``_out_of_scope`` instead of the pk for the rows out of the scope of this queryset
+        """
+        if len(attnames) == 1:
+            filters = Q(**{"{}__in".format(attnames[0]): [getattr(obj, attnames[0]) for obj in objs]})
+        else:
+            filters = Q()
+            for obj in objs:
+                filters |= Q(**{name: getattr(obj, name) for name in attnames})
+        rows = self.model._base_manager.using(self.db).filter(filters).values_list("pk", *attnames)
+        existing = {tuple(row[1:]): row[0] for row in rows}
+        if existing:
+            in_scope = set(
+                self._scoped().using(self.db).filter(pk__in=list(existing.values())).values_list("pk", flat=True)
+            )
+            existing = {key: pk if pk in in_scope else _out_of_scope for key, pk in existing.items()}
+        return existing
 
     def update_or_create(self, defaults=None, **kwargs):
         defaults = defaults or {}
@@ -0,0 +1,306 @@
+"""
+Compiled ``relations_limit`` filter plans.
+
+A filter plan holds everything about a model's ``Meta.relations_limit`` that does not depend on the
+current context params: the relation paths, the related models they resolve to and the lookup prefix
+to apply to the related filters. Plans are compiled once (at app ready time or on first use) so that
+``get_filter()`` only has to bind the related managers' filters for the current request.
+"""
+
+import copy
+
+from django.apps import apps
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+from django.db.models import Exists, OuterRef, Q
+from django.db.models.fields.related import ForeignObjectRel
+
+# Compiled plans by (model, relations_limit)
+_filter_plans = {}
+
+
+def get_related_model(model, path):
+    """
+    Follow a ``__`` separated relation path starting from ``model`` and return the model it points to.
+    """
+    for name in path.split("__"):
+        field = model._meta.get_field(name)
+        if issubclass(type(field), models.ForeignKey):
+            model = field.remote_field.get_related_field().model
+        elif issubclass(type(field), ForeignObjectRel):
+            model = field.related_model
+        elif issubclass(type(field), models.ManyToManyField):
+            model = field.remote_field.get_related_field().model
+    return model
+
+
+def has_stock_get_filter(manager):
+    """
+    True if manager ``get_filter()`` is the one of ``DALManager`` or ``DALTreeManager``, i.e. it only ANDs the
+    filters of its relations_limit, so that they may be flattened into the filter of another model
+    """
+    from django_dal.managers import DALManager
+    from django_dal.mptt_managers import DALTreeManager
+
+    return type(manager).get_filter in (DALManager.get_filter, DALTreeManager.get_filter)
+
+
+def _prefix_node(node, prefix):
+    children = []
+    for child in node.children:
+        if isinstance(child, tuple):
+            child = ("{}__{}".format(prefix, child[0]), child[1])
+        elif isinstance(child, Q):
+            child = _prefix_node(child, prefix)
+        children.append(child)
+    if all(new is old for new, old in zip(children, node.children)):
+        # nothing to prefix in this subtree, share it
+        return node
+    prefixed = copy.copy(node)
+    prefixed.children = children
+    return prefixed
+
+
+def add_prefix(qset, prefix):
+    """
+    Return a copy of ``qset`` with ``prefix`` added to all its lookups.
+
+    ``qset`` is never modified and subtrees without lookups are shared with the copy, so filters returned
+    by ``get_filter()`` may be cached and shared between calls and threads as long as they are not modified
+    in place.
+
+    :param qset: Q object
+    :param prefix: relation path, e.g. ``company__group``
+    :return: Q object
+    """
+    return _prefix_node(qset, prefix)
+
+
+class RelationsGraph:
+    """
+    Dependencies between models declared by ``relations_limit``.
+
+    A model depends on the related model of each of its ``relations_limit`` whose manager is able to give a
+    filter. The graph is used to detect cycles, which would otherwise recurse forever in ``get_filter()``, to
+    compile plans in dependency order and to flatten chains of relations into a single list of join paths.
+    """
+
+    def __init__(self):
+        # direct dependencies by model, as lists of (relation path, related model)
+        self._edges = {}
+
+    def edges(self, model, relations_limit=None):
+        """
+        Direct dependencies of model
+
+        :param model: model class
+        :param relations_limit: optional list of relations, default is ``model._meta.relations_limit``
+        :return: list of (relation path, related model) tuples
+        """
+        if relations_limit is not None:
+            return self._get_edges(model, relations_limit)
+        try:
+            return self._edges[model]
+        except KeyError:
+            edges = self._edges[model] = self._get_edges(model, getattr(model._meta, "relations_limit", None) or [])
+            return edges
+
+    def _get_edges(self, model, relations_limit):
+        edges = []
+        for relation_limit in relations_limit:
+            related_model = get_related_model(model, relation_limit)
+            manager = getattr(related_model, "objects", None)
+            if related_model is not None and callable(getattr(manager, "get_filter", None)):
+                edges.append((relation_limit, related_model))
+        return edges
+
+    def add_models(self, models):
+        for model in models:
+            self.edges(model)
+
+    def find_cycle(self):
+        """
+        :return: list of models forming a cycle, e.g. [A, B, A], or None
+        """
+        done = set()
+
+        def visit(model, stack):
+            if model in stack:
+                return stack[stack.index(model) :] + [model]
+            if model in done:
+                return None
+            for relation_limit, related_model in self.edges(model):
+                cycle = visit(related_model, stack + [model])
+                if cycle:
+                    return cycle
+            done.add(model)
+            return None
+
+        for model in list(self._edges):
+            cycle = visit(model, [])
+            if cycle:
+                return cycle
+        return None
+
+    def topological_order(self):
+        """
+        Models of the graph, each one after the models it depends on
+
+        :raises ImproperlyConfigured: if relations_limit declarations form a cycle
+        :return: list of models
+        """
+        cycle = self.find_cycle()
+        if cycle:
+            raise ImproperlyConfigured(
+                "relations_limit cycle: {}".format(" -> ".join(model._meta.label for model in cycle))
+            )
+        order = []
+        done = set()
+
+        def visit(model):
+            if model not in done:
+                done.add(model)
+                for relation_limit, related_model in self.edges(model):
+                    visit(related_model)
+                order.append(model)
+
+        for model in list(self._edges):
+            visit(model)
+        return order
+
+    def flatten(self, model, relations_limit=None, _stack=()):
+        """
+        Follow the relations of model and of its related models and return them as a flat list of join paths.
+
+        Related models whose manager has the stock ``get_filter()`` (see ``has_stock_get_filter``) are flattened:
+        their own relations are followed here and their filter is then requested with ``relations_limit=[]``.
+        The other related models are kept as they are and give their full filter, since a custom ``get_filter()``
+        may combine or skip the filters of its relations (e.g. with OR, or for superusers).
+        Repeated paths, e.g. ``project__company`` reached both directly and through ``project``, are collapsed
+        into one.
+
+        :raises ImproperlyConfigured: if relations_limit declarations form a cycle
+        :return: list of (path, related model, local) tuples, local is True for flattened related models
+        """
+        _stack = _stack + (model,)
+        flattened = []
+        paths = set()
+        for relation_limit, related_model in self.edges(model, relations_limit):
+            if related_model in _stack:
+                raise ImproperlyConfigured(
+                    "relations_limit cycle: {}".format(
+                        " -> ".join(m._meta.label for m in _stack[_stack.index(related_model) :] + (related_model,))
+                    )
+                )
+            if has_stock_get_filter(related_model.objects):
+                entries = [(relation_limit, related_model, True)] + [
+                    ("{}__{}".format(relation_limit, path), m, local)
+                    for path, m, local in self.flatten(related_model, _stack=_stack)
+                ]
+            else:
+                entries = [(relation_limit, related_model, False)]
+            for entry in entries:
+                if entry[0] not in paths:
+                    paths.add(entry[0])
+                    flattened.append(entry)
+        return flattened
+
+
+relations_graph = RelationsGraph()
+
+
+class FilterPlan:
+    """
+    Relations of a model to follow when building its row-limiting filter.
+
+    ``entries`` is the flattened list of ``(prefix, related_model, local)`` tuples returned by
+    ``RelationsGraph.flatten()``.
+    """
+
+    def __init__(self, model, relations_limit):
+        self.model = model
+        self.relations_limit = tuple(relations_limit)
+        self.entries = relations_graph.flatten(model, relations_limit)
+
+    def bind(self):
+        """
+        Build the filter for the current context params.
+
+        :return: Q object
+        """
+        qsets = Q()
+        for prefix, related_model, local in self.entries:
+            if local:
+                filters = related_model.objects.get_filter(relations_limit=[])
+            else:
+                filters = related_model.objects.get_filter()
+            if isinstance(filters, Q):
+                qsets &= add_prefix(filters, prefix)
+        return qsets
+
+    def __repr__(self):
+        return "<{}: {} {}>".format(self.__class__.__name__, self.model._meta.label, list(self.relations_limit))
+
+
+def get_filter_plan(model, relations_limit=None):
+    """
+    Return the compiled filter plan of ``model``, compiling it on first use.
+
+    :param model: model class
+    :param relations_limit: optional list of relations, default is ``model._meta.relations_limit``
+    :return: FilterPlan
+    """
+    if relations_limit is None:
+        relations_limit = getattr(model._meta, "relations_limit", None) or []
+    key = (model, tuple(relations_limit))
+    try:
+        return _filter_plans[key]
+    except KeyError:
+        plan = _filter_plans[key] = FilterPlan(model, relations_limit)
+        return plan
+
+
+def apply_filter(queryset, filters):
+    """
+    Filter queryset with the row-limiting filters of its model according to ``Meta.relations_limit_mode``:
+
+    * ``join`` (default): filters are applied as they are, e.g. ``company__group=...``
+    * ``exists``: filters are applied in a correlated ``EXISTS`` subquery on the model primary key
+    * ``subquery``: filters are applied in a ``pk IN (SELECT ...)`` subquery
+
+    The subquery modes let the database use semi-joins and never duplicate rows through reverse
+    and many to many relations.
+
+    :param queryset: queryset to filter
+    :param filters: Q object, e.g. from ``get_filter()``
+    :return: queryset
+    """
+    model = queryset.model
+    mode = getattr(model._meta, "relations_limit_mode", None) or "join"
+    if mode == "join":
+        return queryset.filter(filters)
+    if not filters:
+        return queryset
+    if mode == "exists":
+        return queryset.filter(Exists(model._base_manager.filter(filters, pk=OuterRef("pk"))))
+    if mode == "subquery":
+        return queryset.filter(pk__in=model._base_manager.filter(filters).values("pk"))
+    raise ImproperlyConfigured(
+        "Invalid relations_limit_mode {} for {}, use join, exists or subquery".format(mode, model._meta.label)
+    )
+
+
+def compile_filter_plans():
+    """
+    Build the relations graph of all installed models with a ``relations_limit`` and compile their filter plans
+
+    :raises ImproperlyConfigured: if relations_limit declarations form a cycle
+    """
+    global relations_graph
+    _filter_plans.clear()
+    relations_graph = RelationsGraph()
+    relations_graph.add_models(
+        model for model in apps.get_models() if isinstance(getattr(model._meta, "relations_limit", None), list)
+    )
+    for model in relations_graph.topological_order():
+        get_filter_plan(model)
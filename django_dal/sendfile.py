@@ -0,0 +1,203 @@
+"""
+Send media files, once authorized, directly from Django or through the front web server.
+
+Settings:
+DJANGO_DAL_SENDFILE_BACKEND = 'plain'  # plain (default, Django streams the file), nginx, apache or lighttpd
+DJANGO_DAL_SENDFILE_URL = '/protected-media/'  # nginx only, prefix of the internal location serving MEDIA_ROOT
+DJANGO_DAL_MEDIA_CACHE_MAX_AGE = 0  # plain only, max-age of the private Cache-Control header
+
+Nginx configuration example:
+location /protected-media/ {
+    internal;
+    alias /path/to/media/;
+}
+"""
+
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def get_file_path(path, document_root=None):
+    """
+    Absolute path of path below document_root (default MEDIA_ROOT)
+
+    :raises Http404: if path is outside document_root or is not a file
+    """
+    try:
+        fullpath = safe_join(document_root or settings.MEDIA_ROOT, path)
+    except ValueError:
+        raise Http404("File not found")
+    if not os.path.isfile(fullpath):
+        raise Http404("File not found")
+    return fullpath
+
+
+def _server_response(path):
+    content_type, encoding = mimetypes.guess_type(path)
+    response = HttpResponse(content_type=content_type or "application/octet-stream")
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+
+class RangeFile:
+    """
+    Read only the first length bytes of an open file, from its current position
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def get_etag(stat):
+    return '"{:x}-{:x}"'.format(stat.st_mtime_ns, stat.st_size)
+
+
+def is_not_modified(request, etag, mtime):
+    """
+    :return: True if the conditional headers of request match the file, If-None-Match takes precedence
+    """
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        return "*" in etags or etag in [tag.removeprefix("W/") for tag in etags]
+    if_modified_since = parse_http_date_safe(request.headers.get("If-Modified-Since") or "")
+    return if_modified_since is not None and int(mtime) <= if_modified_since
+
+
+def get_range(request, etag, mtime, size):
+    """
+    Byte range requested by a single range Range header, honouring If-Range.
+    Multiple ranges and invalid headers are ignored, so the whole file is sent.
+
+    :return: tuple of first and last byte, None for the whole file, or False if the range is not satisfiable
+    """
+    match = RANGE_RE.match(request.headers.get("Range", "").replace(" ", ""))
+    if not match or match.groups() == ("", ""):
+        return None
+    if_range = request.headers.get("If-Range")
+    if if_range:
+        if if_range.startswith('"'):
+            if if_range != etag:
+                return None
+        elif parse_http_date_safe(if_range) != int(mtime):
+            return None
+    start, end = match.groups()
+    if not start:
+        # suffix range, the last bytes
+        length = int(end)
+        if not length or not size:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size:
+        return False
+    if end < start:
+        return None
+    return start, end
+
+
+def sendfile_plain(request, path, document_root=None):
+    """
+    Send the file from Django with FileResponse, supporting conditional GET (ETag and Last-Modified)
+    and single byte ranges (206 Partial Content)
+    """
+    fullpath = get_file_path(path, document_root)
+    stat = os.stat(fullpath)
+    etag = get_etag(stat)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(stat.st_mtime),
+        "Cache-Control": "private, max-age={}".format(getattr(settings, "DJANGO_DAL_MEDIA_CACHE_MAX_AGE", 0)),
+        "Accept-Ranges": "bytes",
+    }
+    if is_not_modified(request, etag, stat.st_mtime):
+        return HttpResponseNotModified(headers=headers)
+
+    byte_range = get_range(request, etag, stat.st_mtime, stat.st_size)
+    if byte_range is False:
+        response = HttpResponse(status=416, headers=headers)
+        response.headers["Content-Range"] = "bytes */{}".format(stat.st_size)
+        return response
+
+    content_type, encoding = mimetypes.guess_type(fullpath)
+    content_type = content_type or "application/octet-stream"
+    file = open(fullpath, "rb")
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type, headers=headers)
+    else:
+        start, end = byte_range
+        file.seek(start)
+        if end == stat.st_size - 1:
+            # up to the end of the file: keep the file object so the server can use sendfile
+            response = FileResponse(file, status=206, content_type=content_type, headers=headers)
+        else:
+            response = FileResponse(
+                RangeFile(file, end - start + 1), status=206, content_type=content_type, headers=headers
+            )
+            response.headers["Content-Length"] = end - start + 1
+        response.headers["Content-Range"] = "bytes {}-{}/{}".format(start, end, stat.st_size)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def sendfile_nginx(request, path, document_root=None):
+    url = getattr(settings, "DJANGO_DAL_SENDFILE_URL", None)
+    if not url:
+        raise ImproperlyConfigured("DJANGO_DAL_SENDFILE_URL is required by the nginx sendfile backend")
+    get_file_path(path, document_root)
+    response = _server_response(path)
+    response.headers["X-Accel-Redirect"] = quote("{}/{}".format(url.rstrip("/"), path.lstrip("/")))
+    return response
+
+
+def sendfile_xsendfile(request, path, document_root=None):
+    response = _server_response(path)
+    response.headers["X-Sendfile"] = get_file_path(path, document_root)
+    return response
+
+
+BACKENDS = {
+    "plain": sendfile_plain,
+    "nginx": sendfile_nginx,
+    "apache": sendfile_xsendfile,
+    "lighttpd": sendfile_xsendfile,
+}
+
+
+def sendfile(request, path, document_root=None):
+    """
+    Response sending the file at path below document_root (default MEDIA_ROOT) with the backend
+    configured in settings.DJANGO_DAL_SENDFILE_BACKEND, the permissions must be already checked.
+    """
+    backend = getattr(settings, "DJANGO_DAL_SENDFILE_BACKEND", "plain")
+    try:
+        function = BACKENDS[backend]
+    except KeyError:
+        raise ImproperlyConfigured(
+            "Invalid DJANGO_DAL_SENDFILE_BACKEND {}, use one of {}".format(backend, ", ".join(BACKENDS))
+        )
+    return function(request, path, document_root=document_root)
@@ -1,3 +1,8 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from inspect import signature
+
 from django.http import HttpResponse
 
 from django_dal.params import cxpr
@@ -19,9 +24,75 @@ class HttpResponseForbiddenInfo(HttpResponse):
         raise AttributeError("403 Forbidden: permission {}, user {}".format(self.perm_code, self.user))
 
 
+# Permission decisions of the active permission_scope blocks, as (user, {(model options, perm_name): allowed})
+_permission_scope = ContextVar("permission_scope", default=None)
+
+
+def _has_permission(user, opts, perm_name):
+    key = (opts.app_label, perm_name, opts.model_name)
+    cache = cxpr.get_permission_cache(user)
+    allowed = cache.get(key)
+    if allowed is None:
+        allowed = user.has_perm(f"{opts.app_label}.{perm_name}_{opts.model_name}")
+        cache.set(key, allowed)
+    return allowed
+
+
 def check_permission(model, perm_name):
+    """
+    Check that the context user has the ``perm_name`` permission on model.
+    Decisions are cached on the context user object by (app_label, perm_name, model_name),
+    until the context params are reset or the user changes.
+
+    :param model: model class or instance
+    :param perm_name: e.g. view, add, change, delete
+    :raises AttributeError: from HttpResponseForbiddenInfo if not allowed
+    """
     if model is not None:
-        perm_code = f"{model._meta.app_label}.{perm_name}_{model._meta.model_name}"
-        if cxpr.user is not None:
-            if not cxpr.user.has_perm(perm_code):
-                return HttpResponseForbiddenInfo(**{"perm_code": perm_code, "user": cxpr.user})
+        user = cxpr.user
+        if user is not None:
+            opts = model._meta
+            allowed = None
+            scope = _permission_scope.get()
+            if scope is not None and scope[0] is user:
+                allowed = scope[1].get((opts, perm_name))
+            if allowed is None:
+                allowed = _has_permission(user, opts, perm_name)
+            if not allowed:
+                perm_code = f"{opts.app_label}.{perm_name}_{opts.model_name}"
+                return HttpResponseForbiddenInfo(**{"perm_code": perm_code, "user": user})
+
+
+@contextmanager
+def permission_scope(model, perm_names=("add", "change", "delete")):
+    """
+    Check the ``perm_names`` permissions of the context user on model once, when entering the block,
+    and reuse the decisions for every ``check_permission`` in the block, e.g. when saving many objects.
+    A denied permission still raises at the first call that needs it.
+
+    :param model: model class
+    :param perm_names: permissions to check
+    """
+    user = cxpr.user
+    decisions = {}
+    scope = _permission_scope.get()
+    if scope is not None and scope[0] is user:
+        decisions.update(scope[1])
+    if user is not None:
+        opts = model._meta
+        for perm_name in perm_names:
+            decisions[(opts, perm_name)] = _has_permission(user, opts, perm_name)
+    token = _permission_scope.set((user, decisions))
+    try:
+        yield
+    finally:
+        _permission_scope.reset(token)
+
+
+@lru_cache(maxsize=None)
+def accepts_argument(klass, method_name, argument):
+    """
+    Whether ``klass.<method_name>`` accepts ``argument``, resolved once per class,
+    e.g. if a manager ``get_queryset`` accepts ``ignore_filters``.
+    """
+    return signature(getattr(klass, method_name)).parameters.get(argument, None) is not None
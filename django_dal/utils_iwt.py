@@ -11,6 +11,8 @@ from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import serialization
 from django.conf import settings
 from django.core.exceptions import BadRequest, ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 
 
 def read_file_or_str_bytes(path_or_str):
@@ -42,6 +44,77 @@ def read_file_or_str_bytes(path_or_str):
     return None
 
 
+class RSAKeys:
+    """
+    Registry of the RSA keys of settings.DJANGO_DAL_RSA_KEYS, each key is read and parsed once.
+
+    With settings.DJANGO_DAL_RSA_KEYS_RELOAD = True the keys configured as pathlib.Path are reloaded
+    when the modification time of their files changes, e.g. on key rotation.
+    """
+
+    def __init__(self):
+        # parsed keys by sources, with the mtimes of the sources
+        self.keys = {}
+
+    def _get_mtimes(self, sources):
+        if not getattr(settings, "DJANGO_DAL_RSA_KEYS_RELOAD", False):
+            return None
+        mtimes = []
+        for source in sources:
+            try:
+                mtimes.append(source.stat().st_mtime_ns if isinstance(source, Path) else None)
+            except OSError:
+                mtimes.append(None)
+        return tuple(mtimes)
+
+    def _get(self, kind, sources, loader):
+        mtimes = self._get_mtimes(sources)
+        entry = self.keys.get((kind, sources))
+        if entry is not None and entry[0] == mtimes:
+            return entry[1]
+        key = loader(*(read_file_or_str_bytes(source) for source in sources))
+        self.keys[(kind, sources)] = (mtimes, key)
+        return key
+
+    def get_private_key(self):
+        """
+        :return: private key of DJANGO_DAL_RSA_KEYS.local, or None if not configured
+        """
+        local = getattr(settings, "DJANGO_DAL_RSA_KEYS", {}).get("local", {})
+        if local.get("private") is None:
+            return None
+        return self._get(
+            "private",
+            (local["private"], local.get("passphrase")),
+            lambda pem_bytes, passphrase: serialization.load_pem_private_key(
+                pem_bytes, password=passphrase, backend=default_backend()
+            ),
+        )
+
+    def get_public_key(self, source):
+        """
+        :param source: public key configured in DJANGO_DAL_RSA_KEYS.remotes.public, pathlib.Path or bytes string
+        :return: public key
+        """
+        return self._get(
+            "public",
+            (source,),
+            lambda pem_bytes: serialization.load_pem_public_key(pem_bytes, backend=default_backend()),
+        )
+
+    def reset(self):
+        self.keys = {}
+
+
+rsa_keys = RSAKeys()
+
+
+@receiver(setting_changed)
+def reset_rsa_keys(setting, **kwargs):
+    if setting in ("DJANGO_DAL_RSA_KEYS", "DJANGO_DAL_RSA_KEYS_RELOAD"):
+        rsa_keys.reset()
+
+
 def orginal_exception_msg(e):
     return "due to {}: {}".format(e.__class__.__name__, str(e))
 
@@ -85,6 +158,7 @@ def encode_jwt(request, audience, issuer=None, expiration=30, extra_payload=None
             'passphrase': 'my local passphrase',  # optional bytestr or None
         },
     }
+    The key is parsed once, see RSAKeys.
 
     :param request:
     :param audience: required audience urn (generally the proxy host)
@@ -96,17 +170,19 @@ def encode_jwt(request, audience, issuer=None, expiration=30, extra_payload=None
     if True raise ImproperlyConfigured if not private key configured in settings: DJANGO_DAL_RSA_KEYS.local.private
     :return:
     """
-    pem_bytes = read_file_or_str_bytes(getattr(settings, "DJANGO_DAL_RSA_KEYS", {}).get("local", {}).get("private"))
-    if jwt_required is True and pem_bytes is None:
+    try:
+        private_key = rsa_keys.get_private_key()
+    except ImproperlyConfigured:
+        # key file not found or invalid setting
+        raise
+    except Exception as e:
+        # most likely invalid private key or passphrase
+        raise ImproperlyConfigured("Unable to ecode JWT token" + (orginal_exception_msg(e) if debug else ""))
+    if jwt_required is True and private_key is None:
         raise ImproperlyConfigured("No RSA key found in settings: DJANGO_DAL_RSA_KEYS.local.private")
 
-    passphrase = read_file_or_str_bytes(
-        getattr(settings, "DJANGO_DAL_RSA_KEYS", {}).get("local", {}).get("passphrase")
-    )  # optional
-
-    if pem_bytes is not None:
+    if private_key is not None:
         try:
-            private_key = serialization.load_pem_private_key(pem_bytes, password=passphrase, backend=default_backend())
             _data = {
                 "exp": datetime.datetime.now(tz=timezone.utc) + datetime.timedelta(seconds=expiration),
                 "nbf": datetime.datetime.now(tz=timezone.utc),  # not before
@@ -127,7 +203,6 @@ def encode_jwt(request, audience, issuer=None, expiration=30, extra_payload=None
             )
             return encoded_jwt
         except Exception as e:
-            # most likely invalid private key
             raise ImproperlyConfigured("Unable to ecode JWT token" + (orginal_exception_msg(e) if debug else ""))
 
     return None
@@ -148,6 +223,7 @@ def decode_jwt(request, jwt_required=False, debug=False) -> Tuple[bool, Optional
             }
         }
     }
+    Keys are parsed once, see RSAKeys.
 
     :param request:
     :param jwt_required: default False, denotes if JWT autentication is required for given request
@@ -183,10 +259,10 @@ def decode_jwt(request, jwt_required=False, debug=False) -> Tuple[bool, Optional
         if issuer is None:
             raise BadRequest("No Referer found in request headers")
 
-        public_key = read_file_or_str_bytes(
-            wildcards_get(getattr(settings, "DJANGO_DAL_RSA_KEYS", {}).get("remotes", {}).get("public", {}), issuer)
+        public_key_source = wildcards_get(
+            getattr(settings, "DJANGO_DAL_RSA_KEYS", {}).get("remotes", {}).get("public", {}), issuer
         )
-        if public_key is None:
+        if public_key_source is None:
             raise ImproperlyConfigured(
                 "No RSA key found in settings: DJANGO_DAL_RSA_KEYS.remotes.public.{}".format(issuer)
             )
@@ -212,6 +288,7 @@ def decode_jwt(request, jwt_required=False, debug=False) -> Tuple[bool, Optional
     # at this point we ensured the JWT was sent and the receiver is part of the audience of that issuer,
     # therefore if it fails we alwasy return an authentication error and an error message (exception)
     try:
+        public_key = rsa_keys.get_public_key(public_key_source)
         jwt_payload = jwt.decode(
             request.body,
             public_key,
@@ -230,6 +307,9 @@ def decode_jwt(request, jwt_required=False, debug=False) -> Tuple[bool, Optional
         return False, jwt_payload, "JWT token is not yet valid (nbf)"
     except jwt.InvalidTokenError:  # Base exception when decode() fails on a token
         return False, jwt_payload, "JWT invalid token"
+    except ImproperlyConfigured as e:
+        # public key file not found or invalid setting
+        return False, jwt_payload, str(e)
     except Exception as e:
         # with wrog public key does not raise jwt specific exception
         return False, jwt_payload, "Unable to decode JWT token" + (orginal_exception_msg(e) if debug else "")
@@ -4,11 +4,12 @@ import re
 import urllib
 
 from django.conf import settings
-from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import PermissionDenied
 from django.http import Http404, HttpResponse, HttpResponseRedirect
 from django.views.generic import View
-from django.views.static import serve
+
+from django_dal.media import SIGNATURE_PARAM, check_media_signature, media_registry, public_rules
+from django_dal.sendfile import sendfile
 
 
 class BaseSendFileView(View):
@@ -18,45 +19,34 @@ class BaseSendFileView(View):
         _path = self.kwargs.get("path", None)
         if _path in ["", None]:
             return Http404("Path is not sended")
-        else:
-            filepath = _path  # = os.path.join(settings.MEDIA_URL, _path)
+
+        # Clean up given path to only allow serving files below document_root,
+        # rules are matched on the normalized path only
+        filepath, stable = self.clear_path(_path)
+        if filepath and not stable:
+            return HttpResponseRedirect(filepath)
 
         # custom rule (to increase in future)
-        for rule in settings.DJANGO_DAL_RULES:
-            if "regex" in rule:
-                pattern = re.compile(rule["regex"])
-                if pattern.match(filepath):
-                    return self.serve(filepath)
+        if public_rules.match(filepath):
+            return self.serve(filepath)
+
+        # signed url, already authorized when signed
+        signature = request.GET.get(SIGNATURE_PARAM)
+        if signature and check_media_signature(request, filepath, signature):
+            return self.serve(filepath)
 
         # standard
         if not self.request.user.is_authenticated:
             return HttpResponse("Unauthorized", status=401)
 
-        filepath, stable = self.clear_path(filepath)
-
-        # Clean up given path to only allow serving files below document_root.
-        if filepath and not stable:
-            return HttpResponseRedirect(filepath)
-
         # check permissions
-        _found = False
-        for ct in ContentType.objects.all():
-            Model = ct.model_class()
-            if Model is not None and request.user.has_perm(
-                "{}.view_{}".format(Model._meta.app_label, Model._meta.model_name)
-            ):
-                for field in Model._meta.fields:
-                    if hasattr(field, "upload_to"):
-                        if Model.objects.filter(**{field.name: _path}).exists():
-                            _found = True
-
-        if not _found:
+        if not media_registry.is_allowed(request.user, filepath):
             raise PermissionDenied("File not found or user has no enough permissions")
 
         return self.serve(filepath)
 
     def serve(self, filepath):
-        return serve(self.request, filepath, document_root=settings.MEDIA_ROOT, show_indexes=False)
+        return sendfile(self.request, filepath, document_root=settings.MEDIA_ROOT)
 
     def clear_path(self, filepath):
         filepath = posixpath.normpath(urllib.parse.unquote(filepath))
@@ -0,0 +1,31 @@
+"""
+Benchmarks, not collected by ``make test``: run them with ``make bench`` or one module at a time, e.g.
+``python runtests.py tests.benchmarks.bench_relations``.
+
+Each benchmark compares the current code with a ``legacy_*`` copy of the code it replaced, the numbers quoted
+in the module docstrings were measured with Python 3.11, Django 5.1 and SQLite in memory.
+"""
+
+import sys
+import timeit
+
+
+class BenchmarkMixin:
+    #: timings are the best of repeat runs
+    repeat = 5
+
+    def measure(self, function, number=1000):
+        """
+        :return: best time of a call of function, in microseconds
+        """
+        return min(timeit.repeat(function, number=number, repeat=self.repeat)) / number * 1e6
+
+    def report(self, title, rows, unit="us"):
+        """
+        Print rows of (label, value), with the ratio to the first value
+        """
+        lines = ["", title]
+        for label, value in rows:
+            ratio = rows[0][1] / value if value else float("inf")
+            lines.append("  {:<40} {:>10.2f} {}  x{:.1f}".format(label, value, unit, ratio))
+        sys.stdout.write("\n".join(lines) + "\n")
@@ -0,0 +1,92 @@
+"""
+Benchmarks of the media authorization.
+
+Queries and time of ``MediaRegistry.find_owner`` against the loop over every ContentType it replaced, which ran
+one ``exists()`` query per file field of each model the user may view; the decision cache is disabled.
+The test app has 2 models with file fields among 13 content types, times in microseconds:
+
+                                   legacy queries   queries   legacy time   time
+  superuser, attachments/c.txt     3                1         646           421
+  superuser, docs/missing.pdf      3                1         587           676
+  user, attachments/c.txt          3                1         900           654
+  user, docs/missing.pdf           3                1         963           981
+
+The legacy loop runs 1 + one query per file field of the models the user may view, find_owner a single query
+(two only when an indexed row no longer matches). On SQLite in memory a query costs no round trip, so a missing
+path, looked up in a ``UNION ALL`` of the joins of every model, is as slow as the legacy queries; with a database
+server each query saved is a round trip.
+"""
+
+import sys
+
+from django.contrib.auth.models import Group, Permission, User
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from django_dal.media import media_registry
+from django_dal.params import cxpr
+from tests.benchmarks import BenchmarkMixin
+from tests.models import Attachment, Company, Project
+
+
+def legacy_find_owner(user, path):
+    """
+    ``BaseSendFileView`` permission check before the media registry
+    """
+    _found = False
+    for ct in ContentType.objects.all():
+        Model = ct.model_class()
+        if Model is not None and user.has_perm("{}.view_{}".format(Model._meta.app_label, Model._meta.model_name)):
+            for field in Model._meta.fields:
+                if hasattr(field, "upload_to"):
+                    if Model.objects.filter(**{field.name: path}).exists():
+                        _found = True
+    return _found
+
+
+@override_settings(DJANGO_DAL_MEDIA_DECISION_CACHE=None)
+class FindOwnerBenchmark(BenchmarkMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cxpr.set_to_none()
+        cls.group = Group.objects.create(name="a")
+        company = Company.objects.create(name="A", group=cls.group)
+        project = Project.objects.create(company=company, code="A1", doc="docs/a.pdf")
+        Attachment.objects.create(project=project, file="attachments/c.txt")
+        cls.user = User.objects.create(username="user")
+        cls.user.groups.add(cls.group)
+        cls.group.permissions.add(*Permission.objects.filter(codename__in=["view_project", "view_attachment"]))
+        cls.superuser = User.objects.create(username="admin", is_superuser=True)
+
+    def tearDown(self):
+        cxpr.set_to_none()
+
+    def count_queries(self, function):
+        with CaptureQueriesContext(connection) as queries:
+            function()
+        return len(queries)
+
+    def test_find_owner(self):
+        rows = []
+        for label, user, group in (("superuser", self.superuser, None), ("user", self.user, self.group)):
+            user = User.objects.get(pk=user.pk)
+            cxpr.set({"user": user, "group": group})
+            user.get_all_permissions()
+            for path in ("attachments/c.txt", "docs/missing.pdf"):
+                self.assertEqual(legacy_find_owner(user, path), media_registry.find_owner(user, path) is not None)
+                rows.append(
+                    (
+                        "{}, {}".format(label, path),
+                        self.count_queries(lambda: legacy_find_owner(user, path)),
+                        self.count_queries(lambda: media_registry.find_owner(user, path)),
+                        self.measure(lambda: legacy_find_owner(user, path), number=100),
+                        self.measure(lambda: media_registry.find_owner(user, path), number=100),
+                    )
+                )
+        lines = ["", "find_owner, {} content types".format(ContentType.objects.count())]
+        lines.append("  {:<35} {:>14} {:>8} {:>10} {:>8}".format("", "legacy queries", "queries", "legacy us", "us"))
+        for row in rows:
+            lines.append("  {:<35} {:>14} {:>8} {:>10.1f} {:>8.1f}".format(*row))
+        sys.stdout.write("\n".join(lines) + "\n")
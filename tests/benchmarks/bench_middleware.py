@@ -0,0 +1,83 @@
+"""
+Benchmarks of ContextParamsMiddleware.
+
+Requests per second of a logged in user to an async view through the ASGI handler (``AsyncClient``), with the
+async capable middleware against the sync only middleware it replaced, which makes Django run it in a thread
+and the async view in a nested event loop, in milliseconds per request (``AsyncClient`` overhead included):
+
+                   sync only   async capable
+  anonymous        0.65        0.61
+  logged in user   1.81        1.66
+
+The thread hop saved is about 10% of an anonymous request. For a logged in user both are within the noise of
+a few runs: the session and the user are loaded in a thread by both, the async middleware evaluating
+``request.user`` in ``aget_from_request``, so the gain is that the view itself stays in the event loop.
+"""
+
+import time
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from django_dal.params import cxpr, get_context_params
+from tests.benchmarks import BenchmarkMixin
+
+MIDDLEWARE = [
+    "django.contrib.sessions.middleware.SessionMiddleware",
+    "django.contrib.auth.middleware.AuthenticationMiddleware",
+]
+
+
+class LegacyContextParamsMiddleware:
+    """
+    ``ContextParamsMiddleware`` before the async support
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        context_params = get_context_params()
+        context_params.set_to_none()
+        context_params.set_from_request(request)
+        context_params.set_from_request_post(request)
+
+        response = self.get_response(request)
+        return response
+
+
+class MiddlewareBenchmark(BenchmarkMixin, TestCase):
+    requests = 300
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="user")
+
+    def tearDown(self):
+        cxpr.set_to_none()
+
+    async def measure_requests(self, expected):
+        best = None
+        for run in range(self.repeat):
+            start = time.perf_counter()
+            for index in range(self.requests):
+                response = await self.async_client.get("/username/")
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        self.assertEqual(response.content, expected)
+        # milliseconds per request
+        return best / self.requests * 1000
+
+    async def test_asgi(self):
+        for title, login in (("anonymous", False), ("logged in user", True)):
+            if login:
+                await self.async_client.aforce_login(self.user)
+            rows = []
+            for label, middleware in (
+                ("sync only middleware", "tests.benchmarks.bench_middleware.LegacyContextParamsMiddleware"),
+                ("async capable middleware", "django_dal.middleware.ContextParamsMiddleware"),
+            ):
+                with override_settings(MIDDLEWARE=MIDDLEWARE + [middleware]):
+                    rows.append((label, await self.measure_requests(b"user" if login else b"")))
+            await sync_to_async(self.report)("ASGI requests to an async view, {}".format(title), rows, unit="ms")
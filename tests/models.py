@@ -0,0 +1,86 @@
+from django.contrib.auth.models import Group
+from django.db import models
+from django.db.models import Q
+from mptt.fields import TreeForeignKey
+
+from django_dal.managers import DALManager
+from django_dal.models import DALModel, DALMPTTModel
+from django_dal.params import cxpr
+
+
+class CompanyManager(DALManager):
+    def get_filter(self, relations_limit=None):
+        filters = super().get_filter(relations_limit=relations_limit)
+        if cxpr.group is not None:
+            filters &= Q(group=cxpr.group)
+        return filters
+
+
+class Company(DALModel):
+    name = models.CharField(max_length=50)
+    group = models.ForeignKey(Group, on_delete=models.CASCADE)
+
+    objects = CompanyManager()
+
+
+class PartnerManager(DALManager):
+    def get_filter(self, relations_limit=None):
+        # public partners are visible to everyone
+        return super().get_filter(relations_limit=relations_limit) | Q(public=True)
+
+
+class Partner(DALModel):
+    name = models.CharField(max_length=50)
+    owner = models.ForeignKey(Company, on_delete=models.CASCADE)
+    public = models.BooleanField(default=False)
+
+    objects = PartnerManager()
+
+    class Meta:
+        relations_limit = ["owner"]
+
+
+class Contract(DALModel):
+    partner = models.ForeignKey(Partner, on_delete=models.CASCADE)
+
+    class Meta:
+        relations_limit = ["partner"]
+
+
+class Project(DALModel):
+    company = models.ForeignKey(Company, on_delete=models.CASCADE)
+    code = models.CharField(max_length=20, unique=True)
+    value = models.IntegerField(default=0)
+    doc = models.FileField(upload_to="docs", blank=True)
+
+    class Meta:
+        relations_limit = ["company"]
+
+
+class Task(DALModel):
+    project = models.ForeignKey(Project, on_delete=models.CASCADE)
+    name = models.CharField(max_length=50)
+
+    class Meta:
+        relations_limit = ["project"]
+
+
+class Comment(DALModel):
+    task = models.ForeignKey(Task, on_delete=models.CASCADE)
+    text = models.CharField(max_length=50)
+
+    class Meta:
+        relations_limit = ["task"]
+
+
+class Attachment(DALModel):
+    project = models.ForeignKey(Project, on_delete=models.CASCADE)
+    file = models.FileField(upload_to="attachments")
+
+    class Meta:
+        relations_limit = ["project"]
+
+
+class Folder(DALMPTTModel):
+    name = models.CharField(max_length=50)
+    parent = TreeForeignKey("self", null=True, blank=True, on_delete=models.CASCADE, related_name="children")
@@ -0,0 +1,21 @@
+from django.contrib.auth.models import AnonymousUser, Group, User
+
+from django_dal.params import ContextParam, ContextParams
+
+
+def get_group(request):
+    return ContextParams.get_user_group(request.user) if request.user.is_authenticated else None
+
+
+class TestParams(ContextParams):
+    params = [
+        ContextParam("user", [User, AnonymousUser], "Request user"),
+        ContextParam("group", Group, "User group", resolver=get_group),
+    ]
+
+    def get_from_request(self, request):
+        return {"user": request.user}
+
+
+class SnapshotTestParams(TestParams):
+    snapshot_storage = True
@@ -0,0 +1,32 @@
+import tempfile
+
+SECRET_KEY = "django-dal-tests"
+
+INSTALLED_APPS = [
+    "django.contrib.auth",
+    "django.contrib.contenttypes",
+    "django.contrib.sessions",
+    "mptt",
+    "django_dal",
+    "tests",
+]
+
+DATABASES = {"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}}
+
+MIDDLEWARE = [
+    "django.contrib.sessions.middleware.SessionMiddleware",
+    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "django_dal.middleware.ContextParamsMiddleware",
+]
+
+ROOT_URLCONF = "tests.urls"
+
+CONTEXT_PARAMS = "tests.params.TestParams"
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix="django_dal_tests_")
+
+DJANGO_DAL_RULES = [{"regex": "^public/"}]
+
+DEFAULT_AUTO_FIELD = "django.db.models.AutoField"
+
+USE_TZ = True
@@ -0,0 +1,90 @@
+from unittest import mock
+
+from django.contrib.auth.models import Group, User
+from django.test import TestCase
+
+from django_dal.executors import DALExecutor, _run_in_process, deserialize_params, serialize_params
+from django_dal.params import cxpr
+
+
+def get_params():
+    return cxpr.user, cxpr.group
+
+
+def get_group_pk():
+    return cxpr.group.pk if cxpr.group is not None else None
+
+
+class ExecutorTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="user")
+        cls.group = Group.objects.create(name="a")
+
+    def setUp(self):
+        cxpr.set({"user": self.user, "group": self.group})
+
+    def tearDown(self):
+        cxpr.set_to_none()
+
+
+class SerializeParamsTest(ExecutorTestCase):
+    def test_round_trip(self):
+        serialized = serialize_params({"user": self.user, "group": self.group, "code": "A1", "missing": None})
+        self.assertEqual(
+            serialized,
+            {
+                "user": ("__model__", "auth.User", self.user.pk),
+                "group": ("__model__", "auth.Group", self.group.pk),
+                "code": "A1",
+                "missing": None,
+            },
+        )
+        with self.assertNumQueries(2):
+            values = deserialize_params(serialized)
+        self.assertEqual(values, {"user": self.user, "group": self.group, "code": "A1", "missing": None})
+        self.assertIsNot(values["user"], self.user)
+
+    def test_run_in_process(self):
+        serialized = serialize_params(cxpr.get())
+        cxpr.set_to_none()
+        with mock.patch("django_dal.executors.close_old_connections") as close_old_connections:
+            self.assertEqual(_run_in_process(serialized, get_params), (self.user, self.group))
+        close_old_connections.assert_called_once_with()
+        # the params are set only while running
+        self.assertIsNone(cxpr.user)
+        self.assertIsNone(cxpr.group)
+
+
+class ThreadExecutorTest(ExecutorTestCase):
+    def test_submit(self):
+        with DALExecutor(max_workers=2) as executor:
+            user, group = executor.submit(get_params).result()
+        self.assertIs(user, self.user)
+        self.assertIs(group, self.group)
+
+    def test_map(self):
+        groups = [self.group, Group(pk=self.group.pk + 1, name="b")]
+
+        def get_group(group):
+            cxpr.group = group
+            return get_group_pk()
+
+        with DALExecutor(max_workers=2) as executor:
+            self.assertEqual(list(executor.map(get_group, groups)), [group.pk for group in groups])
+        # workers run in a copy of the caller context
+        self.assertIs(cxpr.group, self.group)
+
+    def test_params_of_submit_time(self):
+        with DALExecutor(max_workers=1) as executor:
+            future = executor.submit(get_group_pk)
+            cxpr.group = None
+        self.assertEqual(future.result(), self.group.pk)
+
+
+class ProcessExecutorTest(ExecutorTestCase):
+    def test_submit(self):
+        # the test database is not shared with the spawned workers, send only values without instances
+        cxpr.set_to_none()
+        with DALExecutor(max_workers=1, processes=True) as executor:
+            self.assertIsNone(executor.submit(get_group_pk).result())
@@ -0,0 +1,64 @@
+import os
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.test import SimpleTestCase, override_settings
+
+from django_dal.utils_iwt import rsa_keys
+
+
+def generate_pem():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+
+
+class RSAKeysTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp(prefix="django_dal_keys")
+        cls.path = Path(cls.directory) / "jwtRS256.key"
+        cls.pems = [generate_pem(), generate_pem()]
+
+    def setUp(self):
+        self.path.write_bytes(self.pems[0])
+        self.loader = self.enterContext(
+            mock.patch(
+                "django_dal.utils_iwt.serialization.load_pem_private_key", wraps=serialization.load_pem_private_key
+            )
+        )
+
+    def rotate(self):
+        self.path.write_bytes(self.pems[1])
+        stat = self.path.stat()
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    def test_parsed_once(self):
+        with override_settings(DJANGO_DAL_RSA_KEYS={"local": {"private": self.path}}):
+            key = rsa_keys.get_private_key()
+            self.assertIs(rsa_keys.get_private_key(), key)
+            self.rotate()
+            self.assertIs(rsa_keys.get_private_key(), key)
+        self.assertEqual(self.loader.call_count, 1)
+
+    def test_reload(self):
+        with override_settings(DJANGO_DAL_RSA_KEYS={"local": {"private": self.path}}, DJANGO_DAL_RSA_KEYS_RELOAD=True):
+            key = rsa_keys.get_private_key()
+            self.assertIs(rsa_keys.get_private_key(), key)
+            self.rotate()
+            rotated = rsa_keys.get_private_key()
+        self.assertEqual(self.loader.call_count, 2)
+        self.assertNotEqual(rotated.private_numbers(), key.private_numbers())
+
+    def test_reset_on_setting_changed(self):
+        with override_settings(DJANGO_DAL_RSA_KEYS={"local": {"private": self.path}}):
+            rsa_keys.get_private_key()
+        with override_settings(DJANGO_DAL_RSA_KEYS={"local": {"private": self.pems[1]}}):
+            rsa_keys.get_private_key()
+            rsa_keys.get_private_key()
+        self.assertEqual(self.loader.call_count, 2)
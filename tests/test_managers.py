@@ -0,0 +1,34 @@
+from unittest import mock
+
+from django_dal.managers import DALManager
+from django_dal.utils import accepts_argument
+from tests.models import Project
+from tests.test_query import ScopeTestCase
+
+
+class LegacyManager(DALManager):
+    def get_queryset(self):
+        return super().get_queryset()
+
+
+class ManagerAllTest(ScopeTestCase):
+    def get_codes(self, queryset):
+        return sorted(queryset.values_list("code", flat=True))
+
+    def test_all(self):
+        self.assertEqual(self.get_codes(Project.objects.all()), ["A1"])
+        self.assertEqual(self.get_codes(Project.objects.all(ignore_filters=True)), ["A1", "B1"])
+
+    def test_get_queryset_without_ignore_filters(self):
+        manager = LegacyManager()
+        manager.model = Project
+        self.assertEqual(self.get_codes(manager.all()), ["A1"])
+        self.assertEqual(self.get_codes(manager.all(ignore_filters=True)), ["A1"])
+
+    def test_signature_resolved_once(self):
+        Project.objects.all()
+        with mock.patch("django_dal.utils.signature") as signature:
+            Project.objects.all()
+            Project.objects.all(ignore_filters=True)
+        signature.assert_not_called()
+        self.assertTrue(accepts_argument(type(Project.objects), "get_queryset", "ignore_filters"))
@@ -0,0 +1,307 @@
+import os
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, Group, Permission, User
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from django_dal.media import (
+    SIGNATURE_PARAM,
+    PublicRules,
+    check_media_signature,
+    get_context_fingerprint,
+    get_media_decision_cache,
+    get_signed_media_url,
+    media_registry,
+    public_rules,
+    sign_media_path,
+)
+from django_dal.params import cxpr
+from django_dal.views_mal import BaseSendFileView
+from tests.models import Attachment, Company, Project
+
+
+class MediaTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cxpr.set_to_none()
+        for path in ("docs/a.pdf", "docs/b.pdf", "attachments/c.txt", "public/p.txt"):
+            os.makedirs(os.path.join(settings.MEDIA_ROOT, os.path.dirname(path)), exist_ok=True)
+            with open(os.path.join(settings.MEDIA_ROOT, path), "wb") as file:
+                file.write(b"0123456789")
+        cls.group_a = Group.objects.create(name="a")
+        cls.group_b = Group.objects.create(name="b")
+        cls.company_a = Company.objects.create(name="A", group=cls.group_a)
+        cls.company_b = Company.objects.create(name="B", group=cls.group_b)
+        cls.project_a = Project.objects.create(company=cls.company_a, code="A1", doc="docs/a.pdf")
+        cls.project_b = Project.objects.create(company=cls.company_b, code="B1", doc="docs/b.pdf")
+        Attachment.objects.create(project=cls.project_a, file="attachments/c.txt")
+        cls.user = User.objects.create(username="user")
+        cls.user.groups.add(cls.group_a)
+        cls.group_a.permissions.add(Permission.objects.get(codename="view_project"))
+        cls.superuser = User.objects.create(username="admin", is_superuser=True)
+
+    def tearDown(self):
+        cxpr.set_to_none()
+
+
+class MediaDecisionCacheTest(MediaTestCase):
+    def setUp(self):
+        # a new cache for each test
+        self.enterContext(override_settings(DJANGO_DAL_MEDIA_DECISION_CACHE="local"))
+        self.decisions = get_media_decision_cache()
+        self.user = User.objects.get(pk=self.user.pk)
+        self.user.get_all_permissions()
+        self.set_user()
+
+    def set_user(self):
+        cxpr.set({"user": self.user, "group": self.group_a})
+
+    def set_superuser(self):
+        # the rows are changed by the superuser
+        cxpr.set({"user": self.superuser})
+
+    def test_cached(self):
+        self.assertTrue(media_registry.is_allowed(self.user, "docs/a.pdf"))
+        with self.assertNumQueries(0):
+            self.assertTrue(media_registry.is_allowed(self.user, "docs/a.pdf"))
+        self.assertEqual(self.decisions.stats()["hits"], 1)
+        self.assertEqual(self.decisions.stats()["misses"], 1)
+        self.assertEqual(self.decisions.stats()["ratio"], 0.5)
+
+    def test_context_fingerprint(self):
+        fingerprint = get_context_fingerprint()
+        self.assertEqual(get_context_fingerprint(), fingerprint)
+        cxpr.set({"user": self.user, "group": Group.objects.get(pk=self.group_a.pk)})
+        self.assertEqual(get_context_fingerprint(), fingerprint)
+        cxpr.set({"user": self.user, "group": self.group_b})
+        self.assertNotEqual(get_context_fingerprint(), fingerprint)
+
+    def test_context_fingerprint_of_values_without_key(self):
+        for value in (object(), Group.objects.all(), Group(name="unsaved")):
+            with self.subTest(value=type(value)), mock.patch("django_dal.media.get_context_params") as params:
+                params.return_value.get.return_value = {"user": self.user, "value": value}
+                with self.assertNumQueries(0):
+                    self.assertIsNone(get_context_fingerprint())
+                self.assertTrue(media_registry.is_allowed(self.user, "docs/a.pdf"))
+        self.assertEqual(self.decisions.stats()["misses"], 0)
+
+    def test_keyed_by_context(self):
+        self.assertTrue(media_registry.is_allowed(self.user, "docs/a.pdf"))
+        cxpr.set({"user": self.user, "group": self.group_b})
+        self.assertFalse(media_registry.is_allowed(self.user, "docs/a.pdf"))
+        self.assertTrue(media_registry.is_allowed(self.user, "docs/b.pdf"))
+
+    def test_invalidated_on_create(self):
+        self.assertFalse(media_registry.is_allowed(self.user, "docs/new.pdf"))
+        self.set_superuser()
+        Project.objects.create(company=self.company_a, code="A2", doc="docs/new.pdf")
+        self.set_user()
+        self.assertTrue(media_registry.is_allowed(self.user, "docs/new.pdf"))
+
+    def test_invalidated_on_update(self):
+        self.assertTrue(media_registry.is_allowed(self.user, "docs/a.pdf"))
+        self.set_superuser()
+        project = Project.objects.get(pk=self.project_a.pk)
+        project.doc = "docs/other.pdf"
+        project.save()
+        self.set_user()
+        self.assertFalse(media_registry.is_allowed(self.user, "docs/a.pdf"))
+
+    def test_invalidated_on_delete(self):
+        self.assertTrue(media_registry.is_allowed(self.user, "docs/a.pdf"))
+        self.set_superuser()
+        Project.objects.get(pk=self.project_a.pk).delete()
+        self.set_user()
+        self.assertFalse(media_registry.is_allowed(self.user, "docs/a.pdf"))
+
+    def test_invalidated_on_user_groups_change(self):
+        self.assertTrue(media_registry.is_allowed(self.user, "docs/a.pdf"))
+        self.user.groups.remove(self.group_a)
+        user = User.objects.get(pk=self.user.pk)
+        cxpr.set({"user": user, "group": self.group_a})
+        self.assertFalse(media_registry.is_allowed(user, "docs/a.pdf"))
+
+    def test_invalidated_on_group_permissions_change(self):
+        self.assertTrue(media_registry.is_allowed(self.user, "docs/a.pdf"))
+        self.group_a.permissions.clear()
+        user = User.objects.get(pk=self.user.pk)
+        cxpr.set({"user": user, "group": self.group_a})
+        self.assertFalse(media_registry.is_allowed(user, "docs/a.pdf"))
+
+
+@override_settings(DJANGO_DAL_MEDIA_DECISION_CACHE=None)
+class FindOwnerTest(MediaTestCase):
+    def test_single_query_for_superuser(self):
+        cxpr.set({"user": self.superuser})
+        with self.assertNumQueries(1):
+            self.assertEqual(media_registry.find_owner(self.superuser, "attachments/c.txt"), (Attachment, "file"))
+        with self.assertNumQueries(1):
+            self.assertIsNone(media_registry.find_owner(self.superuser, "docs/missing.pdf"))
+
+    def test_single_query_after_permissions(self):
+        user = User.objects.get(pk=self.user.pk)
+        cxpr.set({"user": user, "group": self.group_a})
+        user.get_all_permissions()
+        with self.assertNumQueries(1):
+            self.assertEqual(media_registry.find_owner(user, "docs/a.pdf"), (Project, "doc"))
+        with self.assertNumQueries(2):
+            # the indexed row is of another group, then all the models are looked up
+            self.assertIsNone(media_registry.find_owner(user, "docs/b.pdf"))
+        with self.assertNumQueries(1) as queries:
+            # no view permission on Attachment, only Project is looked up
+            self.assertIsNone(media_registry.find_owner(user, "attachments/c.txt"))
+        self.assertNotIn("tests_attachment", queries.captured_queries[0]["sql"])
+
+    def test_no_query_without_permissions(self):
+        user = User.objects.create(username="guest")
+        user.get_all_permissions()
+        with self.assertNumQueries(0):
+            self.assertIsNone(media_registry.find_owner(user, "docs/a.pdf"))
+
+
+@override_settings(DJANGO_DAL_MEDIA_DECISION_CACHE=None)
+class MediaIndexTest(MediaTestCase):
+    def setUp(self):
+        media_registry.owners.clear()
+        # the rows are changed by the superuser
+        cxpr.set({"user": self.superuser})
+
+    def create_project(self, code, doc):
+        return Project.objects.create(company=self.company_a, code=code, doc=doc)
+
+    def test_indexed_on_save(self):
+        project = self.create_project("A2", "docs/new.pdf")
+        self.assertEqual(media_registry.get_owners("docs/new.pdf"), ((Project, "doc", project.pk),))
+        with self.assertNumQueries(1) as queries:
+            self.assertEqual(media_registry.find_owner(self.superuser, "docs/new.pdf"), (Project, "doc"))
+        self.assertIn('"tests_project"."id" = {}'.format(project.pk), queries.captured_queries[0]["sql"])
+        self.assertNotIn("tests_attachment", queries.captured_queries[0]["sql"])
+
+    def test_indexed_on_update(self):
+        project = self.create_project("A2", "docs/new.pdf")
+        project.doc = "docs/moved.pdf"
+        project.save()
+        self.assertEqual(media_registry.get_owners("docs/moved.pdf"), ((Project, "doc", project.pk),))
+        with self.assertNumQueries(2):
+            # the stale entry of the previous path does not grant access
+            self.assertIsNone(media_registry.find_owner(self.superuser, "docs/new.pdf"))
+
+    def test_removed_on_delete(self):
+        project = self.create_project("A2", "docs/new.pdf")
+        other = self.create_project("A3", "docs/new.pdf")
+        project.delete()
+        self.assertEqual(media_registry.get_owners("docs/new.pdf"), ((Project, "doc", other.pk),))
+        other.delete()
+        self.assertEqual(media_registry.get_owners("docs/new.pdf"), ())
+
+    def test_indexed_when_found(self):
+        self.assertEqual(media_registry.get_owners("docs/a.pdf"), ())
+        self.assertEqual(media_registry.find_owner(self.superuser, "docs/a.pdf"), (Project, "doc"))
+        self.assertEqual(media_registry.get_owners("docs/a.pdf"), ((Project, "doc", self.project_a.pk),))
+
+    def test_max_path_owners(self):
+        projects = [self.create_project("P{}".format(index), "docs/shared.pdf") for index in range(6)]
+        owners = media_registry.get_owners("docs/shared.pdf")
+        self.assertEqual(
+            owners,
+            tuple((Project, "doc", project.pk) for project in reversed(projects[-media_registry.max_path_owners :])),
+        )
+
+
+class PublicRulesTest(SimpleTestCase):
+    def test_compile(self):
+        prefixes, patterns = PublicRules().compile(
+            [{"regex": "^public/"}, {"regex": "static/"}, {"regex": r"^thumbs/.*\.png$"}, {"regex": r"^img/\d+"}]
+        )
+        self.assertEqual(prefixes, ("public/", "static/"))
+        self.assertEqual(len(patterns), 1)
+
+    def test_compile_fallback(self):
+        prefixes, patterns = PublicRules().compile([{"regex": "(?i)^a/.*"}, {"regex": "^(?P<x>b)/.*"}])
+        self.assertEqual(len(patterns), 2)
+
+    def test_match(self):
+        rules = PublicRules()
+        rules.compiled = rules.compile([{"regex": "^public/"}, {"regex": r"^thumbs/.*\.png$"}])
+        self.assertTrue(rules.match("public/a.pdf"))
+        self.assertTrue(rules.match("thumbs/a/b.png"))
+        self.assertFalse(rules.match("thumbs/a/b.jpg"))
+        self.assertFalse(rules.match("docs/public/a.pdf"))
+
+    def test_reset_on_setting_changed(self):
+        with override_settings(DJANGO_DAL_RULES=[{"regex": "^docs/"}]):
+            self.assertTrue(public_rules.match("docs/a.pdf"))
+        self.assertFalse(public_rules.match("docs/a.pdf"))
+
+    def test_rules_matched_on_normalized_path(self):
+        # public/../docs/a.pdf is docs/a.pdf, it is not public
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        response = BaseSendFileView.as_view()(request, path="public/../docs/a.pdf")
+        self.assertEqual(response.status_code, 401)
+        response = BaseSendFileView.as_view()(request, path="public//p.txt")
+        self.assertEqual(response.status_code, 200)
+
+
+class SignedMediaTest(MediaTestCase):
+    def get_request(self, client=None, user=None):
+        client = client or self.client
+        request = RequestFactory().get("/")
+        request.session = client.session
+        request.user = user or AnonymousUser()
+        return request
+
+    def test_signed_url(self):
+        self.client.force_login(self.user)
+        url = get_signed_media_url(self.get_request(), "docs/a.pdf")
+        self.assertTrue(url.startswith("/media/docs/a.pdf?{}=".format(SIGNATURE_PARAM)))
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_unsigned_url_without_session(self):
+        request = RequestFactory().get("/")
+        self.assertEqual(get_signed_media_url(request, "docs/a.pdf"), "/media/docs/a.pdf")
+
+    def test_signed_view_without_queries(self):
+        self.client.force_login(self.user)
+        request = self.get_request()
+        signature = sign_media_path(request, "docs/b.pdf")
+        request = RequestFactory().get("/", {SIGNATURE_PARAM: signature})
+        request.session = self.client.session
+        request.user = AnonymousUser()
+        with self.assertNumQueries(0):
+            response = BaseSendFileView.as_view()(request, path="docs/b.pdf")
+        self.assertEqual(response.status_code, 200)
+
+    def test_bound_to_path(self):
+        self.client.force_login(self.user)
+        request = self.get_request()
+        signature = sign_media_path(request, "docs/a.pdf")
+        self.assertTrue(check_media_signature(request, "docs/a.pdf", signature))
+        self.assertFalse(check_media_signature(request, "docs/b.pdf", signature))
+        self.assertFalse(check_media_signature(request, "docs/a.pdf", signature[:-1]))
+
+    def test_bound_to_session(self):
+        self.client.force_login(self.user)
+        signature = sign_media_path(self.get_request(), "docs/a.pdf")
+        other = self.client_class()
+        other.force_login(self.user)
+        self.assertFalse(check_media_signature(self.get_request(other), "docs/a.pdf", signature))
+        response = other.get("/media/docs/b.pdf", {SIGNATURE_PARAM: sign_media_path(self.get_request(), "docs/b.pdf")})
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(DJANGO_DAL_MEDIA_SIGNATURE_BINDING="user")
+    def test_bound_to_user(self):
+        signature = sign_media_path(self.get_request(user=self.user), "docs/a.pdf")
+        self.assertIsNone(sign_media_path(self.get_request(), "docs/a.pdf"))
+        self.assertTrue(check_media_signature(self.get_request(user=self.user), "docs/a.pdf", signature))
+        self.assertFalse(check_media_signature(self.get_request(user=self.superuser), "docs/a.pdf", signature))
+        self.assertFalse(check_media_signature(self.get_request(), "docs/a.pdf", signature))
+
+    def test_expired(self):
+        self.client.force_login(self.user)
+        request = self.get_request()
+        signature = sign_media_path(request, "docs/a.pdf")
+        with override_settings(DJANGO_DAL_MEDIA_SIGNATURE_MAX_AGE=-1):
+            self.assertFalse(check_media_signature(request, "docs/a.pdf", signature))
+        self.assertTrue(check_media_signature(request, "docs/a.pdf", signature))
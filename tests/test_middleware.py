@@ -0,0 +1,42 @@
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+
+from django_dal.middleware import ContextParamsMiddleware
+from django_dal.params import cxpr
+
+
+class ContextParamsMiddlewareTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="user")
+        self.request = RequestFactory().get("/")
+        self.request.user = self.user
+
+    def tearDown(self):
+        cxpr.set_to_none()
+
+    def test_sync(self):
+        middleware = ContextParamsMiddleware(lambda request: HttpResponse(cxpr.user.username))
+        self.assertFalse(iscoroutinefunction(middleware))
+        self.assertEqual(middleware(self.request).content, b"user")
+
+    async def test_async(self):
+        async def view(request):
+            # sync code called from the view sees the params of the request
+            username = await sync_to_async(lambda: cxpr.user.username)()
+            return HttpResponse(username)
+
+        middleware = ContextParamsMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(self.request)
+        self.assertEqual(response.content, b"user")
+
+    async def test_async_client(self):
+        # through the ASGI handler, with the async session and authentication middlewares
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get("/username/")
+        self.assertEqual(response.content, b"user")
+        await self.async_client.alogout()
+        response = await self.async_client.get("/username/")
+        self.assertEqual(response.content, b"")
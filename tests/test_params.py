@@ -0,0 +1,224 @@
+from contextvars import copy_context
+
+from django.contrib.auth.models import AnonymousUser, Group, User
+from django.test import RequestFactory, TestCase, override_settings
+
+from django_dal.cache import SharedCache
+from django_dal.params import (
+    ContextParam,
+    ContextParams,
+    ContextVarsStorage,
+    SnapshotStorage,
+    cxpr,
+    get_context_params,
+    get_user_group_cache,
+)
+
+
+class ModulePropertyTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="user")
+
+    def tearDown(self):
+        cxpr.set_to_none()
+
+    def test_read_and_assign(self):
+        cxpr.set({"user": self.user})
+        self.assertIs(cxpr.user, self.user)
+        self.assertIs(get_context_params().user, self.user)
+
+        group = Group.objects.create(name="group")
+        cxpr.group = group
+        self.assertIs(get_context_params().group, group)
+        self.assertIs(cxpr.group, group)
+
+    def test_assign_before_first_read(self):
+        with override_settings(CONTEXT_PARAMS="tests.params.TestParams"):
+            cxpr.user = self.user
+            self.assertNotIn("user", vars(cxpr))
+            self.assertIs(get_context_params().user, self.user)
+
+    def test_methods_of_bound_instance(self):
+        cxpr.set({"user": self.user})
+        self.assertEqual(cxpr.get()["user"], self.user)
+        self.assertIn("user", cxpr.describe())
+
+
+class ParamsIndexTest(TestCase):
+    def tearDown(self):
+        cxpr.set_to_none()
+
+    def test_unknown_param(self):
+        message = "Param missing does not exist in ContextParams"
+        with self.assertRaisesMessage(Exception, message):
+            cxpr.set({"missing": 1})
+        with self.assertRaisesMessage(Exception, message):
+            cxpr.set_post({"missing": 1})
+
+    def test_types(self):
+        user = User(username="user")
+        cxpr.set({"user": AnonymousUser()})
+        cxpr.set_post({"user": user})
+        self.assertIs(cxpr.user, user)
+        with self.assertRaisesMessage(Exception, "does not match param type"):
+            cxpr.set_post({"user": Group(name="group")})
+
+
+class LazyParamsTest(TestCase):
+    def setUp(self):
+        self.group = Group.objects.create(name="group")
+        self.calls = []
+        self.request = RequestFactory().get("/")
+        self.request.user = AnonymousUser()
+
+    def resolve_group(self, request):
+        self.calls.append(request)
+        return self.group
+
+    def test_resolved_once_on_first_access(self):
+        class Params(ContextParams):
+            params = [ContextParam("group", Group, "Group", resolver=self.resolve_group)]
+
+        params = Params()
+        params.set_from_request(self.request)
+        self.assertEqual(self.calls, [])
+        self.assertEqual(params.group, self.group)
+        self.assertEqual(params.group, self.group)
+        self.assertEqual(self.calls, [self.request])
+
+    def test_resolver_redeclared_in_subclass(self):
+        class Params(ContextParams):
+            params = [ContextParam("group", Group, "Group")]
+
+        class LazyParams(Params):
+            params = [ContextParam("group", Group, "Group", resolver=self.resolve_group)]
+
+        params = LazyParams()
+        params.set_from_request(self.request)
+        self.assertEqual(params.group, self.group)
+
+
+class UserGroupCacheTest(TestCase):
+    def setUp(self):
+        self.group_a = Group.objects.create(name="a")
+        self.group_b = Group.objects.create(name="b")
+        self.user = User.objects.create(username="user")
+        self.user.groups.add(self.group_a)
+        get_user_group_cache().clear()
+
+    def get_group(self):
+        # a new user object, as in a new request
+        return ContextParams.get_user_group(User.objects.get(pk=self.user.pk))
+
+    def assertCachedGroup(self, group):
+        self.assertEqual(self.get_group(), group)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get_group(), group)
+
+    def test_process_cache(self):
+        self.assertCachedGroup(self.group_a)
+        self.user.groups.set([self.group_b])
+        self.assertCachedGroup(self.group_b)
+
+    @override_settings(DJANGO_DAL_GROUP_CACHE="default")
+    def test_shared_cache(self):
+        self.assertIsInstance(get_user_group_cache(), SharedCache)
+        self.assertCachedGroup(self.group_a)
+        self.user.groups.set([self.group_b])
+        self.assertCachedGroup(self.group_b)
+        self.group_b.delete()
+        self.assertCachedGroup(None)
+
+
+class StorageTestMixin:
+    context_params = "tests.params.TestParams"
+    storage_class = ContextVarsStorage
+
+    def setUp(self):
+        self.enterContext(override_settings(CONTEXT_PARAMS=self.context_params))
+        self.group = Group.objects.create(name="group")
+        self.user = User.objects.create(username="user")
+        self.user.groups.add(self.group)
+        get_user_group_cache().clear()
+
+    def tearDown(self):
+        cxpr.set_to_none()
+
+    def test_storage(self):
+        self.assertIsInstance(get_context_params().__dict__["storage"], self.storage_class)
+
+    def test_set(self):
+        cxpr.set({"user": self.user, "group": self.group})
+        self.assertIs(cxpr.user, self.user)
+        self.assertIs(cxpr.group, self.group)
+        self.assertEqual(cxpr.get(), {"user": self.user, "group": self.group})
+        # params not in values are reset
+        cxpr.set({"group": self.group})
+        self.assertIsNone(cxpr.user)
+        self.assertIs(cxpr.group, self.group)
+
+    def test_set_invalid_type(self):
+        cxpr.set({"user": self.user})
+        with self.assertRaises(Exception):
+            cxpr.set({"group": self.user})
+        self.assertEqual(cxpr.get(), {"user": None, "group": None})
+
+    def test_set_post(self):
+        cxpr.set({"user": self.user})
+        cxpr.set_post({"group": self.group})
+        self.assertEqual(cxpr.get(), {"user": self.user, "group": self.group})
+
+    def test_set_to_none(self):
+        cxpr.set({"user": self.user, "group": self.group})
+        cxpr.set_to_none()
+        self.assertEqual(cxpr.get(), {"user": None, "group": None})
+
+    def test_set_defaults(self):
+        class Params(ContextParams):
+            snapshot_storage = self.storage_class is SnapshotStorage
+            params = [ContextParam("code", str, "Code", default="A"), ContextParam("value", int, "Value")]
+
+        params = Params()
+        params.set({"code": "B", "value": 1})
+        params.set_defaults()
+        self.assertEqual(params.get(), {"code": "A", "value": None})
+        self.assertEqual(params.code, "A")
+
+    def test_lazy_param(self):
+        request = RequestFactory().get("/")
+        request.user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            get_context_params().set_from_request(request)
+        self.assertEqual(cxpr.group, self.group)
+        with self.assertNumQueries(0):
+            self.assertEqual(cxpr.group, self.group)
+            self.assertEqual(get_context_params().get_getters()["group"](), self.group)
+
+    def test_getters(self):
+        cxpr.user = self.user
+        getters = get_context_params().get_getters()
+        self.assertIs(getters["user"](), self.user)
+        self.assertIsNone(getters["group"]())
+        cxpr.group = self.group
+        self.assertIs(getters["group"](), self.group)
+
+    def test_run(self):
+        cxpr.set({"user": self.user})
+        result = get_context_params().run({"group": self.group}, lambda: (cxpr.user, cxpr.group))
+        self.assertEqual(result, (None, self.group))
+        self.assertEqual(cxpr.get(), {"user": self.user, "group": None})
+
+    def test_copied_context(self):
+        context = copy_context()
+        cxpr.user = self.user
+        self.assertIsNone(context.run(lambda: cxpr.user))
+        self.assertIs(cxpr.user, self.user)
+
+
+class ContextVarsStorageTest(StorageTestMixin, TestCase):
+    pass
+
+
+class SnapshotStorageTest(StorageTestMixin, TestCase):
+    context_params = "tests.params.SnapshotTestParams"
+    storage_class = SnapshotStorage
@@ -0,0 +1,115 @@
+from unittest import mock
+
+from django.contrib.auth.models import Group, Permission, User
+from django.test import TestCase
+
+from django_dal.params import cxpr
+from django_dal.utils import check_permission
+from tests.models import Company, Folder, Project, Task
+
+
+class CheckPermissionTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="user")
+        self.permission = Permission.objects.get(codename="change_project")
+        self.user.user_permissions.add(self.permission)
+
+    def tearDown(self):
+        cxpr.set_to_none()
+
+    def assertDenied(self):
+        with self.assertRaises(AttributeError):
+            check_permission(Project, "change")
+
+    def test_decisions_cached_on_user_object(self):
+        user = User.objects.get(pk=self.user.pk)
+        cxpr.set({"user": user})
+        self.assertIsNone(check_permission(Project, "change"))
+        with self.assertNumQueries(0):
+            self.assertIsNone(check_permission(Project, "change"))
+
+    def test_reloaded_user_not_granted_revoked_permission(self):
+        cxpr.set({"user": User.objects.get(pk=self.user.pk)})
+        self.assertIsNone(check_permission(Project, "change"))
+        self.user.user_permissions.remove(self.permission)
+
+        cxpr.user = User.objects.get(pk=self.user.pk)
+        self.assertDenied()
+
+    def test_set_post_user_resets_decisions(self):
+        cxpr.set({"user": User.objects.get(pk=self.user.pk)})
+        self.assertIsNone(check_permission(Project, "change"))
+        self.user.user_permissions.remove(self.permission)
+
+        cxpr.set_post({"user": User.objects.get(pk=self.user.pk)})
+        self.assertDenied()
+
+
+class PermissionScopeTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name="A", group=Group.objects.create(name="a"))
+        cls.user = User.objects.create(username="user")
+        cls.user.user_permissions.add(
+            *Permission.objects.filter(codename__in=["add_project", "change_project", "add_task", "add_folder"])
+        )
+        cls.other = User.objects.create(username="other")
+
+    def setUp(self):
+        cxpr.set({"user": User.objects.get(pk=self.user.pk)})
+        self.has_perm = self.enterContext(
+            mock.patch.object(User, "has_perm", autospec=True, side_effect=User.has_perm)
+        )
+
+    def tearDown(self):
+        cxpr.set_to_none()
+
+    def get_checked(self):
+        return [call.args[1] for call in self.has_perm.call_args_list]
+
+    def test_checked_once_on_entry(self):
+        with Project.permission_scope():
+            self.assertEqual(self.get_checked(), ["tests.add_project", "tests.change_project", "tests.delete_project"])
+            projects = [Project(company=self.company, code="P{}".format(index)) for index in range(3)]
+            for project in projects:
+                project.save()
+                project.value = 1
+                project.save()
+        self.assertEqual(len(self.has_perm.call_args_list), 3)
+
+    def test_denied_at_first_violation(self):
+        project = Project(company=self.company, code="P1")
+        with Project.permission_scope():
+            project.save()
+            with self.assertRaises(AttributeError):
+                project.delete()
+        self.assertTrue(Project._base_manager.filter(pk=project.pk).exists())
+
+    def test_nested(self):
+        with Project.permission_scope(["add"]):
+            with Task.permission_scope(["add"]):
+                self.assertEqual(self.get_checked(), ["tests.add_project", "tests.add_task"])
+                project = Project(company=self.company, code="P1")
+                project.save()
+                task = Task(project=project, name="T1")
+                task.save()
+                self.assertEqual(len(self.has_perm.call_args_list), 2)
+            with self.assertRaises(AttributeError):
+                task.delete()
+
+    def test_ignored_after_user_change(self):
+        with Project.permission_scope(["add"]):
+            cxpr.user = User.objects.get(pk=self.other.pk)
+            with self.assertRaises(AttributeError):
+                Project(company=self.company, code="P1").save()
+        self.assertFalse(Project._base_manager.filter(code="P1").exists())
+
+    def test_mptt_model(self):
+        with Folder.permission_scope():
+            self.assertEqual(self.get_checked(), ["tests.add_folder", "tests.change_folder", "tests.delete_folder"])
+            root = Folder(name="root")
+            root.save()
+            Folder(name="child", parent=root).save()
+            with self.assertRaises(AttributeError):
+                root.delete()
+        self.assertEqual(len(self.has_perm.call_args_list), 3)
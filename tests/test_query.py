@@ -0,0 +1,159 @@
+from unittest import mock
+
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.test import TestCase
+
+from django_dal.params import cxpr
+from django_dal.query import DALQuerySet
+from tests.models import Company, Project
+
+
+class ScopeTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cxpr.set_to_none()
+        cls.group_a = Group.objects.create(name="a")
+        cls.group_b = Group.objects.create(name="b")
+        cls.company_a = Company.objects.create(name="A", group=cls.group_a)
+        cls.company_b = Company.objects.create(name="B", group=cls.group_b)
+        cls.project_a = Project.objects.create(company=cls.company_a, code="A1", value=1)
+        cls.project_b = Project.objects.create(company=cls.company_b, code="B1", value=1)
+
+    def setUp(self):
+        # scope limited to company A
+        cxpr.set({"group": self.group_a})
+
+    def tearDown(self):
+        cxpr.set_to_none()
+
+    def get_values(self):
+        return dict(Project._base_manager.values_list("code", "value"))
+
+
+class BulkUpsertTest(ScopeTestCase):
+    def upsert(self):
+        return Project.objects.bulk_upsert(
+            [
+                Project(company=self.company_b, code="B1", value=77),
+                Project(company=self.company_a, code="A1", value=5),
+                Project(company=self.company_a, code="A2", value=3),
+            ],
+            unique_fields=["code"],
+            update_fields=["value"],
+        )
+
+    def test_native(self):
+        self.assertTrue(connection.features.supports_update_conflicts_with_target)
+        self.assertEqual(self.upsert(), (1, 1))
+        self.assertEqual(self.get_values(), {"A1": 5, "A2": 3, "B1": 1})
+
+    def test_fallback(self):
+        with mock.patch.object(type(connection.features), "supports_update_conflicts_with_target", False):
+            self.assertEqual(self.upsert(), (1, 1))
+        self.assertEqual(self.get_values(), {"A1": 5, "A2": 3, "B1": 1})
+
+
+class BulkUpsertDuplicatesTest(ScopeTestCase):
+    def upsert(self):
+        return Project.objects.bulk_upsert(
+            [
+                Project(company=self.company_a, code="A1", value=5),
+                Project(company=self.company_a, code="A2", value=3),
+                Project(company=self.company_a, code="A2", value=4),
+                Project(company=self.company_a, code="A1", value=6),
+            ],
+            unique_fields=["code"],
+            update_fields=["value"],
+            batch_size=3,
+        )
+
+    def test_native(self):
+        self.assertEqual(self.upsert(), (1, 1))
+        self.assertEqual(self.get_values(), {"A1": 6, "A2": 4, "B1": 1})
+
+    def test_fallback(self):
+        with mock.patch.object(type(connection.features), "supports_update_conflicts_with_target", False):
+            self.assertEqual(self.upsert(), (1, 1))
+        self.assertEqual(self.get_values(), {"A1": 6, "A2": 4, "B1": 1})
+
+
+class ScopedWritesTest(ScopeTestCase):
+    def get_queryset(self):
+        # a queryset not built by the DAL manager, so not filtered yet
+        return DALQuerySet(model=Project)
+
+    def test_update_out_of_scope(self):
+        self.assertEqual(self.get_queryset().filter(code="B1").update(value=9), 0)
+        self.assertEqual(self.get_queryset().update(value=9), 1)
+        self.assertEqual(self.get_values(), {"A1": 9, "B1": 1})
+
+    def test_bulk_update_out_of_scope(self):
+        self.project_a.value = self.project_b.value = 7
+        self.assertEqual(self.get_queryset().bulk_update([self.project_a, self.project_b], ["value"]), 1)
+        self.assertEqual(self.get_values(), {"A1": 7, "B1": 1})
+
+    def test_delete_out_of_scope(self):
+        self.assertEqual(self.get_queryset().filter(code="B1").delete()[0], 0)
+        self.assertEqual(self.get_queryset().delete()[0], 1)
+        self.assertEqual(self.get_values(), {"B1": 1})
+
+    def test_manager_queryset_unchanged(self):
+        with self.assertNumQueries(1) as queries:
+            self.assertEqual(Project.objects.filter(code="B1").update(value=9), 0)
+        # the scope filter is applied once, by the manager
+        self.assertEqual(queries.captured_queries[0]["sql"].count("group_id"), 1)
+
+
+class StreamTest(ScopeTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for code, value in (("A2", 1), ("A3", 2), ("A4", 1), ("A5", 2)):
+            Project.objects.create(company=cls.company_a, code=code, value=value)
+        Project.objects.create(company=cls.company_b, code="B2", value=1)
+
+    def get_codes(self, rows):
+        return [row.code for row in rows]
+
+    def test_chunks(self):
+        with self.assertNumQueries(3):
+            self.assertEqual(self.get_codes(Project.objects.stream(chunk_size=2)), ["A1", "A2", "A3", "A4", "A5"])
+        with self.assertNumQueries(2):
+            # a last empty chunk when the rows are a multiple of chunk_size
+            self.assertEqual(len(list(Project.objects.stream(chunk_size=5))), 5)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(list(Project.objects.stream(chunk_size=6))), 5)
+
+    def test_descending(self):
+        self.assertEqual(
+            self.get_codes(Project.objects.stream(chunk_size=2, keyset_on="-pk")), ["A5", "A4", "A3", "A2", "A1"]
+        )
+
+    def test_fields(self):
+        self.assertEqual(
+            list(Project.objects.filter(value=2).stream(chunk_size=1, fields=["code", "value"])),
+            [("A3", 2), ("A5", 2)],
+        )
+
+    def test_key_not_unique(self):
+        # rows with the same value are paginated by pk
+        self.assertEqual(
+            self.get_codes(Project.objects.stream(chunk_size=2, keyset_on="value")), ["A1", "A2", "A4", "A3", "A5"]
+        )
+        self.assertEqual(
+            list(Project.objects.stream(chunk_size=2, keyset_on="-value", fields=["code"])),
+            [("A5",), ("A3",), ("A4",), ("A2",), ("A1",)],
+        )
+
+    def test_foreign_key(self):
+        cxpr.set_to_none()
+        # paginated by company_id, not by the ordering of Company
+        with mock.patch.object(Company._meta, "ordering", ["-name"]):
+            codes = self.get_codes(Project.objects.stream(chunk_size=1, keyset_on="company"))
+        self.assertEqual(codes, ["A1", "A2", "A3", "A4", "A5", "B1", "B2"])
+
+    def test_nullable_key(self):
+        with mock.patch.object(Project._meta.get_field("value"), "null", True):
+            with self.assertRaises(ValueError):
+                next(Project.objects.stream(keyset_on="value"))
@@ -0,0 +1,120 @@
+import random
+from unittest import mock
+
+from django.contrib.auth.models import Group
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Q
+from django.test import TestCase
+
+from django_dal.params import cxpr
+from django_dal.relations import RelationsGraph, add_prefix, get_filter_plan
+from tests.models import Company, Contract, Partner, Project, Task
+
+
+class RelationsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cxpr.set_to_none()
+        cls.group_a = Group.objects.create(name="a")
+        cls.group_b = Group.objects.create(name="b")
+        cls.company_a = Company.objects.create(name="A", group=cls.group_a)
+        cls.company_b = Company.objects.create(name="B", group=cls.group_b)
+
+    def tearDown(self):
+        cxpr.set_to_none()
+
+
+class FilterPlanTest(RelationsTestCase):
+    def test_plan_compiled_once(self):
+        self.assertIs(get_filter_plan(Task), get_filter_plan(Task))
+        self.assertEqual([entry[0] for entry in get_filter_plan(Task).entries], ["project", "project__company"])
+
+    def test_filter_bound_to_context(self):
+        cxpr.set({"group": self.group_a})
+        self.assertEqual(Project.objects.get_filter(), Q(company__group=self.group_a))
+        cxpr.set({"group": self.group_b})
+        self.assertEqual(Project.objects.get_filter(), Q(company__group=self.group_b))
+
+    def test_add_prefix_does_not_modify_filter(self):
+        filters = Q(group=self.group_a) | Q(name="A")
+        prefixed = add_prefix(filters, "company")
+        self.assertEqual(filters, Q(group=self.group_a) | Q(name="A"))
+        self.assertEqual(prefixed, Q(company__group=self.group_a) | Q(company__name="A"))
+
+    def test_add_prefix_shares_subtrees_without_lookups(self):
+        empty = Q()
+        self.assertIs(add_prefix(empty, "company"), empty)
+        prefixed = add_prefix(Q(empty, name="A"), "company")
+        self.assertIs(prefixed.children[0], empty)
+        self.assertEqual(prefixed.children[1], ("company__name", "A"))
+
+
+class RelationsGraphTest(RelationsTestCase):
+    def test_flatten_stock_managers_only(self):
+        # Project has the stock get_filter, Company a custom one
+        self.assertEqual(
+            RelationsGraph().flatten(Task),
+            [("project", Project, True), ("project__company", Company, False)],
+        )
+        # Partner get_filter ORs its relations filter, they are not followed
+        self.assertEqual(RelationsGraph().flatten(Contract), [("partner", Partner, False)])
+
+    def test_custom_get_filter_combined_with_or(self):
+        private = Partner.objects.create(name="private", owner=self.company_a)
+        public = Partner.objects.create(name="public", owner=self.company_b, public=True)
+        hidden = Partner.objects.create(name="hidden", owner=self.company_b)
+        contracts = [Contract.objects.create(partner=partner) for partner in (private, public, hidden)]
+
+        cxpr.set({"group": self.group_a})
+        self.assertEqual(
+            Contract.objects.get_filter(),
+            Q(partner__owner__group=self.group_a) | Q(partner__public=True),
+        )
+        self.assertEqual(list(Contract.objects.order_by("pk")), contracts[:2])
+
+    def test_cycle(self):
+        class CyclicGraph(RelationsGraph):
+            def edges(self, model, relations_limit=None):
+                return {Project: [("company", Company)], Company: [("project", Project)]}.get(model, [])
+
+        graph = CyclicGraph()
+        graph._edges = {Project: None, Company: None}
+        self.assertEqual(graph.find_cycle(), [Project, Company, Project])
+        with self.assertRaisesMessage(ImproperlyConfigured, "relations_limit cycle: tests.Project -> tests.Company"):
+            graph.topological_order()
+
+
+class RelationsLimitModeTest(RelationsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        rnd = random.Random(20240501)
+        companies = [cls.company_a, cls.company_b]
+        projects = [
+            Project.objects.create(company=rnd.choice(companies), code="P{}".format(index)) for index in range(30)
+        ]
+        for index in range(200):
+            Task.objects.create(project=rnd.choice(projects), name="T{}".format(index))
+
+    def get_pks(self, mode):
+        with mock.patch.object(Task._meta, "relations_limit_mode", mode, create=True):
+            queryset = Task.objects.order_by("pk")
+            return list(queryset.values_list("pk", flat=True)), str(queryset.query)
+
+    def test_modes_return_same_rows(self):
+        for group in (self.group_a, self.group_b):
+            cxpr.set({"group": group})
+            join, join_sql = self.get_pks("join")
+            exists, exists_sql = self.get_pks("exists")
+            subquery, subquery_sql = self.get_pks("subquery")
+            self.assertTrue(join)
+            self.assertEqual(join, exists)
+            self.assertEqual(join, subquery)
+            self.assertIn("JOIN", join_sql)
+            self.assertIn("EXISTS", exists_sql)
+            self.assertIn(" IN (SELECT", subquery_sql)
+
+    def test_invalid_mode(self):
+        cxpr.set({"group": self.group_a})
+        with self.assertRaises(ImproperlyConfigured):
+            self.get_pks("lateral")
@@ -0,0 +1,108 @@
+import os
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+
+
+class SendFileTestCase(SimpleTestCase):
+    url = "/media/public/file.txt"
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, "public"), exist_ok=True)
+        cls.path = os.path.join(settings.MEDIA_ROOT, "public", "file.txt")
+        with open(cls.path, "wb") as file:
+            file.write(b"0123456789")
+
+    def get(self, url=None, **headers):
+        return self.client.get(url or self.url, headers=headers)
+
+
+class SendFileBackendTest(SendFileTestCase):
+    @override_settings(DJANGO_DAL_SENDFILE_BACKEND="nginx", DJANGO_DAL_SENDFILE_URL="/protected/")
+    def test_nginx(self):
+        response = self.get()
+        self.assertEqual(response["X-Accel-Redirect"], "/protected/public/file.txt")
+        self.assertEqual(response.content, b"")
+
+    @override_settings(DJANGO_DAL_SENDFILE_BACKEND="nginx")
+    def test_nginx_requires_url(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.get()
+
+    @override_settings(DJANGO_DAL_SENDFILE_BACKEND="apache")
+    def test_xsendfile(self):
+        self.assertEqual(self.get()["X-Sendfile"], self.path)
+        self.assertEqual(self.get("/media/public/missing.txt").status_code, 404)
+
+    @override_settings(DJANGO_DAL_SENDFILE_BACKEND="ftp")
+    def test_invalid_backend(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.get()
+
+
+class PlainSendFileTest(SendFileTestCase):
+    def content(self, response):
+        return b"".join(response.streaming_content)
+
+    def test_full(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.content(response), b"0123456789")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["Cache-Control"], "private, max-age=0")
+        self.assertTrue(response["ETag"].startswith('"'))
+
+    @override_settings(DJANGO_DAL_MEDIA_CACHE_MAX_AGE=60)
+    def test_max_age(self):
+        self.assertEqual(self.get()["Cache-Control"], "private, max-age=60")
+
+    def test_not_modified(self):
+        response = self.get()
+        self.assertEqual(self.get(if_none_match=response["ETag"]).status_code, 304)
+        self.assertEqual(self.get(if_none_match="W/" + response["ETag"]).status_code, 304)
+        self.assertEqual(self.get(if_none_match="*").status_code, 304)
+        self.assertEqual(self.get(if_modified_since=response["Last-Modified"]).status_code, 304)
+        # If-None-Match takes precedence
+        self.assertEqual(
+            self.get(if_none_match='"other"', if_modified_since=response["Last-Modified"]).status_code, 200
+        )
+
+    def test_ranges(self):
+        for header, content_range, content in (
+            ("bytes=0-3", "bytes 0-3/10", b"0123"),
+            ("bytes=7-", "bytes 7-9/10", b"789"),
+            ("bytes=-3", "bytes 7-9/10", b"789"),
+            ("bytes=-30", "bytes 0-9/10", b"0123456789"),
+            ("bytes=8-100", "bytes 8-9/10", b"89"),
+            ("bytes=4-4", "bytes 4-4/10", b"4"),
+        ):
+            with self.subTest(header):
+                response = self.get(range=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response["Content-Range"], content_range)
+                self.assertEqual(int(response["Content-Length"]), len(content))
+                self.assertEqual(self.content(response), content)
+
+    def test_ignored_ranges(self):
+        for header in ("bytes=0-1,4-5", "bytes=5-2", "items=0-1", "bytes=-"):
+            with self.subTest(header):
+                response = self.get(range=header)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(self.content(response), b"0123456789")
+
+    def test_unsatisfiable_range(self):
+        for header in ("bytes=10-", "bytes=20-30", "bytes=-0"):
+            with self.subTest(header):
+                response = self.get(range=header)
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response["Content-Range"], "bytes */10")
+
+    def test_if_range(self):
+        response = self.get()
+        self.assertEqual(self.get(range="bytes=0-1", if_range=response["ETag"]).status_code, 206)
+        self.assertEqual(self.get(range="bytes=0-1", if_range=response["Last-Modified"]).status_code, 206)
+        self.assertEqual(self.get(range="bytes=0-1", if_range='"other"').status_code, 200)
+        self.assertEqual(self.get(range="bytes=0-1", if_range="Mon, 01 Jan 2001 00:00:00 GMT").status_code, 200)
@@ -0,0 +1,15 @@
+from django.http import HttpResponse
+from django.urls import include, path
+
+from django_dal.params import cxpr
+
+
+async def username(request):
+    # the params are set by the async ContextParamsMiddleware in the request task
+    return HttpResponse(cxpr.user.username if cxpr.user.is_authenticated else "")
+
+
+urlpatterns = [
+    path("username/", username),
+    path("", include("django_dal.urls")),
+]